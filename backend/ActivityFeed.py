@@ -0,0 +1,211 @@
+import asyncio
+import json
+import os
+import select as socket_select
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import event, func, select
+from DatabaseConnector import SessionLocal, engine
+from database.AdminTable import RecentActivity
+import tools
+
+BUFFER_SIZE = int(os.getenv("ACTIVITY_BUFFER_SIZE", 1000))
+KEEPALIVE_SECONDS = 15
+RECONNECT_SECONDS = 3
+# Committed activity is announced on this channel so every worker process sees it
+CHANNEL = "recent_activity"
+RECENT_WINDOW = timedelta(days=1)
+# Event ids are "<epoch>-<seq>"; a Last-Event-ID from another process or an
+# earlier run of this one does not match the epoch and starts over
+EPOCH = uuid.uuid4().hex[:8]
+
+
+class ActivityFeed:
+    """
+    Bounded in-memory ring buffer of the newest RecentActivity rows, fed as
+    they are committed. Every worker process keeps its own buffer, fed by a
+    listener thread on the recent_activity NOTIFY channel, so activity
+    written by any worker reaches the streams of all of them. Every entry
+    gets a sequence number when it reaches the buffer; transactions commit
+    out of id order, so stream subscribers resume from the last sequence
+    they saw rather than from a row id. They are woken on every publish and
+    read what they have not seen yet, so a reconnecting client resumes
+    without touching the database.
+    """
+
+    def __init__(self, max_entries: int = BUFFER_SIZE):
+        self._entries: deque = deque(maxlen=max_entries)
+        self._ids: set = set()
+        self._next_seq = 1
+        self._lock = threading.Lock()
+        self._subscribers: set = set()
+        self._listener = None
+        self._ready = threading.Event()
+
+    def start(self):
+        """Start the listener on first use and wait until the buffer is seeded."""
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name="activity-listener", daemon=True)
+                self._listener.start()
+        self._ready.wait(RECONNECT_SECONDS)
+
+    def _listen(self):
+        while True:
+            raw = None
+            try:
+                raw = engine.raw_connection()
+                raw.detach()
+                conn = raw.driver_connection
+                conn.autocommit = True
+                conn.cursor().execute(f"LISTEN {CHANNEL}")
+                # Listen first, then load: anything committed in between arrives
+                # both ways and is deduplicated. Also fills gaps after a reconnect.
+                self.load_recent()
+                self._ready.set()
+                while True:
+                    if socket_select.select([conn], [], [], KEEPALIVE_SECONDS) == ([], [], []):
+                        continue
+                    conn.poll()
+                    entries = []
+                    while conn.notifies:
+                        entries.append(from_payload(conn.notifies.pop(0).payload))
+                    self.publish(entries)
+            except Exception as e:
+                print(f"❌ activity listener failed: {e}")
+                time.sleep(RECONNECT_SECONDS)
+            finally:
+                if raw is not None:
+                    raw.close()
+
+    def load_recent(self):
+        db = SessionLocal()
+        try:
+            since = datetime.now(tools.PH_TZ) - RECENT_WINDOW
+            rows = (
+                db.query(RecentActivity)
+                .filter(RecentActivity.created_at >= since)
+                .order_by(RecentActivity.id.desc())
+                .limit(self._entries.maxlen)
+                .all()
+            )
+            self.publish([to_entry(row) for row in reversed(rows)])
+        finally:
+            db.close()
+
+    def publish(self, entries: list[dict]):
+        with self._lock:
+            added = False
+            for entry in entries:
+                # The initial load and a notification can both deliver a row
+                if entry["id"] in self._ids:
+                    continue
+                if len(self._entries) == self._entries.maxlen:
+                    self._ids.discard(self._entries[0]["id"])
+                self._entries.append({**entry, "seq": self._next_seq})
+                self._ids.add(entry["id"])
+                self._next_seq += 1
+                added = True
+            subscribers = list(self._subscribers) if added else []
+        for loop, wake in subscribers:
+            loop.call_soon_threadsafe(wake.set)
+
+    def since(self, last_seq: int | None) -> tuple[list[dict], int]:
+        """
+        Entries published after last_seq (the last day of activity for a new
+        client) and the sequence to resume from next time.
+        """
+        with self._lock:
+            entries = list(self._entries)
+            newest = self._next_seq - 1
+        if last_seq is None:
+            cutoff = datetime.now(tools.PH_TZ) - RECENT_WINDOW
+            return [e for e in entries if e["created_at"] >= cutoff], newest
+        return [e for e in entries if e["seq"] > last_seq], newest
+
+    def subscribe(self) -> tuple:
+        subscriber = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: tuple):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+
+def to_entry(row: RecentActivity) -> dict:
+    created_at = row.created_at
+    if created_at.tzinfo is None:
+        created_at = created_at.replace(tzinfo=tools.PH_TZ)
+    return {"id": row.id, "email": row.email, "activity": row.activity, "created_at": created_at}
+
+
+def to_payload(entry: dict) -> str:
+    return json.dumps({**entry, "created_at": entry["created_at"].isoformat()})
+
+
+def from_payload(payload: str) -> dict:
+    entry = json.loads(payload)
+    entry["created_at"] = datetime.fromisoformat(entry["created_at"])
+    return entry
+
+
+def describe(entry: dict) -> str:
+    return f"• {entry['email']} {entry['activity']} {entry['created_at'].strftime('%Y-%m-%d %H:%M:%S')}"
+
+
+def format_event(entry: dict) -> str:
+    data = {
+        "id": entry["id"],
+        "email": entry["email"],
+        "activity": describe(entry),
+        "created_at": entry["created_at"].isoformat(),
+    }
+    return f"id: {EPOCH}-{entry['seq']}\nevent: activity\ndata: {json.dumps(data)}\n\n"
+
+
+activity_feed = ActivityFeed()
+
+
+# ---------------- Session hook ----------------
+# Activity rows are announced when flushed (ids are known then). NOTIFY is
+# transactional: Postgres delivers it on commit and drops it on rollback.
+
+@event.listens_for(SessionLocal, "after_flush")
+def _notify_activity(session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, RecentActivity):
+            session.connection().execute(select(func.pg_notify(CHANNEL, to_payload(to_entry(obj)))))
+
+
+def resume_seq(last_event_id: str | None) -> int | None:
+    epoch, _, seq = (last_event_id or "").partition("-")
+    return int(seq) if epoch == EPOCH and seq.isdigit() else None
+
+
+async def stream(request, last_event_id: str | None):
+    """Server-sent events: backlog first, then new activity as it is committed."""
+    await run_in_threadpool(activity_feed.start)
+    subscriber = activity_feed.subscribe()
+    _, wake = subscriber
+    last_seq = resume_seq(last_event_id)
+    try:
+        yield "retry: 3000\n\n"
+        while True:
+            wake.clear()
+            entries, last_seq = activity_feed.since(last_seq)
+            for entry in entries:
+                yield format_event(entry)
+            try:
+                await asyncio.wait_for(wake.wait(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                if await request.is_disconnected():
+                    break
+                yield ": keep-alive\n\n"
+    finally:
+        activity_feed.unsubscribe(subscriber)
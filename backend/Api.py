@@ -1,5 +1,5 @@
 from fastapi import FastAPI
-from routers import OrdersManagement, ProductManagement, UserEndpoint,EmailVerifiationEnpoint,AdminEndpoint,UserAddressEndpoint,CartsManagement
+from routers import OrdersManagement, ProductManagement, UserEndpoint,EmailVerifiationEnpoint,AdminEndpoint,UserAddressEndpoint,CartsManagement,MediaEndpoint
 def include_routers(app: FastAPI):
 
     app.include_router(UserEndpoint.router)
@@ -8,4 +8,5 @@ def include_routers(app: FastAPI):
     app.include_router(ProductManagement.router)
     app.include_router(OrdersManagement.router)
     app.include_router(UserAddressEndpoint.router)
-    app.include_router(CartsManagement.router)
\ No newline at end of file
+    app.include_router(CartsManagement.router)
+    app.include_router(MediaEndpoint.router)
\ No newline at end of file
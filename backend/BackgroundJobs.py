@@ -0,0 +1,23 @@
+import threading
+import time
+from DatabaseConnector import SessionLocal
+
+
+def run_periodically(name: str, interval_seconds: int, job):
+    """
+    Run job(db) every interval in a daemon thread with a fresh session.
+    The job commits its own work; failures are logged and retried next round.
+    """
+    def run():
+        while True:
+            time.sleep(interval_seconds)
+            db = SessionLocal()
+            try:
+                job(db)
+            except Exception as e:
+                db.rollback()
+                print(f"❌ {name} failed: {e}")
+            finally:
+                db.close()
+
+    threading.Thread(target=run, name=name, daemon=True).start()
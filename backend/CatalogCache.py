@@ -0,0 +1,87 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Bounds how long another worker's product write can go unseen here
+CATALOG_CACHE_TTL_SECONDS = float(os.getenv("CATALOG_CACHE_TTL_SECONDS", 10))
+
+
+class CatalogCache:
+    """
+    In-process cache for serialized catalog responses.
+
+    Every product write path calls invalidate(), which bumps the catalog
+    version and drops all entries. A reader captures the version before it
+    queries the database and put() discards the result if a write happened
+    in between, so a stale page can never be cached under the new version.
+    Each worker process keeps its own cache and invalidate() only reaches
+    that process, so entries also expire after ttl seconds; a write made
+    through another worker shows up here within that time.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = CATALOG_CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._version = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry["expires_at"] <= time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, version: int, body: bytes, headers: dict | None = None) -> dict:
+        entry = {
+            "body": body,
+            "etag": make_etag(body),
+            "headers": headers or {},
+            "expires_at": time.monotonic() + self.ttl,
+        }
+        with self._lock:
+            if version == self._version:
+                self._entries[key] = entry
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entry
+
+    def invalidate(self):
+        with self._lock:
+            self._version += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "version": self._version,
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0,
+            }
+
+
+def make_etag(body: bytes) -> str:
+    # Content based, so it stays valid across restarts and workers
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+catalog_cache = CatalogCache()
@@ -0,0 +1,81 @@
+import csv
+import enum
+import io
+import json
+import zlib
+from datetime import datetime
+from fastapi.responses import StreamingResponse
+from DatabaseConnector import SessionLocal
+
+EXPORT_BATCH_SIZE = 1000
+CHUNK_BYTES = 64 * 1024
+
+
+def export_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, enum.Enum):
+        return value.value
+    return value
+
+
+def encode_rows(rows, columns: list[str], format: str):
+    """Turn rows into CSV or NDJSON text chunks of roughly CHUNK_BYTES."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if format == "csv":
+        writer.writerow(columns)
+    for row in rows:
+        values = [export_value(v) for v in row]
+        if format == "csv":
+            writer.writerow(values)
+        else:
+            buffer.write(json.dumps(dict(zip(columns, values))) + "\n")
+        if buffer.tell() >= CHUNK_BYTES:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def gzip_chunks(chunks):
+    compressor = zlib.compressobj(wbits=31)  # 31 = gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(build_query, columns: list[str], format: str, compress: bool = False):
+    """
+    Stream the rows of build_query(db) with a server-side cursor, so memory
+    stays flat however large the table is. The generator opens its own session
+    because it keeps running after the request handler has returned.
+    """
+    db = SessionLocal()
+    try:
+        rows = build_query(db).execution_options(yield_per=EXPORT_BATCH_SIZE)
+        chunks = encode_rows(rows, columns, format)
+        if compress:
+            yield from gzip_chunks(chunks)
+        else:
+            for chunk in chunks:
+                yield chunk.encode()
+    finally:
+        db.close()
+
+
+def export_response(build_query, columns: list[str], name: str, format: str, compress: bool = False) -> StreamingResponse:
+    """A download of the query as name.csv / name.ndjson, or a .gz file of it."""
+    filename = f"{name}.{format}" + (".gz" if compress else "")
+    if compress:
+        media_type = "application/gzip"
+    else:
+        media_type = "text/csv" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        stream_export(build_query, columns, format, compress),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
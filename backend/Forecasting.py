@@ -0,0 +1,152 @@
+import os
+import threading
+from datetime import timedelta
+import numpy as np
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from database.ProductTable import Products, Sales, SalesDailyRollup
+from SalesStats import ph_today
+
+HISTORY_DAYS = int(os.getenv("FORECAST_HISTORY_DAYS", 56))
+LEAD_TIME_DAYS = int(os.getenv("REORDER_LEAD_TIME_DAYS", 7))
+SERVICE_LEVEL_Z = 1.65  # ~95% of lead-time demand covered by safety stock
+SMA_WINDOW_DAYS = 28
+EWMA_ALPHA = 0.3
+
+
+def load_demand(db: Session) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Daily units sold per product over the last HISTORY_DAYS full days, read
+    from the daily rollup in one query. Returns (product_ids, demand) where
+    demand has one row per product and one column per day, oldest first.
+    """
+    today = ph_today()
+    first_day = today - timedelta(days=HISTORY_DAYS)
+    rows = np.array(
+        db.query(SalesDailyRollup.product_id, SalesDailyRollup.day - first_day, SalesDailyRollup.quantity)
+        .filter(SalesDailyRollup.day >= first_day, SalesDailyRollup.day < today)
+        .all(),
+        dtype=np.int64,
+    ).reshape(-1, 3)
+
+    product_ids, rows_product = np.unique(rows[:, 0], return_inverse=True)
+    demand = np.zeros((len(product_ids), HISTORY_DAYS), dtype=np.float64)
+    np.add.at(demand, (rows_product, rows[:, 1]), rows[:, 2])
+    return product_ids, demand
+
+
+def smoothed_demand(demand: np.ndarray, method: str) -> tuple[np.ndarray, np.ndarray]:
+    """Forecast daily demand and its standard deviation for every product at once."""
+    if method == "sma":
+        recent = demand[:, -SMA_WINDOW_DAYS:]
+        return recent.mean(axis=1), recent.std(axis=1)
+
+    # Exponential smoothing as one weighted sum: the newest day weighs alpha,
+    # each older day (1 - alpha) times less
+    weights = EWMA_ALPHA * (1 - EWMA_ALPHA) ** np.arange(demand.shape[1] - 1, -1, -1)
+    weights /= weights.sum()
+    forecast = demand @ weights
+    variance = ((demand - forecast[:, None]) ** 2) @ weights
+    return forecast, np.sqrt(variance)
+
+
+class DemandModel:
+    """
+    Per-product demand forecasts, cached until new sales arrive. The cache
+    key is the newest sales id plus the day, so a new sale or a new calendar
+    day rebuilds the model on the next request. Stock is not part of the model
+    and is read fresh for every forecast.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries: dict = {}
+
+    def get(self, db: Session, method: str) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        version = (db.query(func.max(Sales.id)).scalar(), ph_today())
+        with self._lock:
+            entry = self._entries.get(method)
+            if entry is not None and entry[0] == version:
+                return entry[1]
+
+        product_ids, demand = load_demand(db)
+        model = (product_ids, *smoothed_demand(demand, method))
+        with self._lock:
+            self._entries[method] = (version, model)
+        return model
+
+
+demand_model = DemandModel()
+
+
+def inventory_arrays(db: Session, method: str, lead_time_days: int) -> dict:
+    """
+    Days of cover, reorder point and suggested order quantity for every
+    active product, computed as whole-catalog array operations.
+    """
+    product_ids, daily_demand, demand_std = demand_model.get(db, method)
+
+    products = db.query(Products.id, Products.tile_name, Products.tile_stock, Products.reserved).filter(
+        Products.is_archived == False
+    ).order_by(Products.id).all()
+    ids = np.array([p.id for p in products], dtype=np.int64)
+    available = np.array([(p.tile_stock or 0) - p.reserved for p in products], dtype=np.float64)
+
+    # Line up the demand model with the current catalog; products without sales forecast zero
+    position = np.searchsorted(product_ids, ids)
+    found = position < len(product_ids)
+    found[found] = product_ids[position[found]] == ids[found]
+    daily = np.zeros(len(ids))
+    std = np.zeros(len(ids))
+    daily[found] = daily_demand[position[found]]
+    std[found] = demand_std[position[found]]
+
+    lead_time_demand = daily * lead_time_days
+    reorder_point = np.ceil(lead_time_demand + SERVICE_LEVEL_Z * std * np.sqrt(lead_time_days))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        days_of_cover = np.where(daily > 0, np.maximum(available, 0) / daily, np.inf)
+    low_stock = (available <= reorder_point) & ((reorder_point > 0) | (available <= 0))
+    # Enough to get back above the reorder point and cover one more lead time
+    suggested = np.maximum(np.ceil(reorder_point + lead_time_demand - available), 0)
+    suggested[~low_stock] = 0
+
+    return {
+        "products": products,
+        "ids": ids,
+        "available": available,
+        "daily": daily,
+        "days_of_cover": days_of_cover,
+        "reorder_point": reorder_point,
+        "suggested": suggested,
+        "low_stock": low_stock,
+    }
+
+
+def forecast_inventory(db: Session, method: str = "ewma", lead_time_days: int = LEAD_TIME_DAYS, low_only: bool = False) -> dict:
+    a = inventory_arrays(db, method, lead_time_days)
+    order = np.argsort(a["days_of_cover"], kind="stable")
+    if low_only:
+        order = order[a["low_stock"][order]]
+    return {
+        "method": method,
+        "lead_time_days": lead_time_days,
+        "history_days": HISTORY_DAYS,
+        "low_stock_count": int(a["low_stock"].sum()),
+        "products": [
+            {
+                "product_id": int(a["ids"][i]),
+                "tile_name": a["products"][i].tile_name,
+                "available": int(a["available"][i]),
+                "daily_demand": round(float(a["daily"][i]), 3),
+                "days_of_cover": None if np.isinf(a["days_of_cover"][i]) else round(float(a["days_of_cover"][i]), 1),
+                "reorder_point": int(a["reorder_point"][i]),
+                "suggested_order_quantity": int(a["suggested"][i]),
+                "low_stock": bool(a["low_stock"][i]),
+            }
+            for i in order
+        ],
+    }
+
+
+def low_stock_count(db: Session) -> int:
+    return int(inventory_arrays(db, "ewma", LEAD_TIME_DAYS)["low_stock"].sum())
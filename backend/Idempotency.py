@@ -0,0 +1,86 @@
+import os
+import json
+import hashlib
+from datetime import datetime, timedelta
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from database.IdempotencyTable import IdempotencyKey
+import tools
+
+IDEMPOTENCY_TTL = timedelta(hours=int(os.getenv("IDEMPOTENCY_TTL_HOURS", 24)))
+PURGE_INTERVAL_SECONDS = 300
+
+
+def request_hash(path: str, body) -> str:
+    payload = json.dumps({"path": path, "body": body}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def claim(db: Session, user_email: str, key: str, req_hash: str) -> JSONResponse | None:
+    """
+    Claim an Idempotency-Key inside the caller's transaction.
+
+    Returns None when the caller should run the request; it must then call
+    store() before committing. Returns the stored response when the key was
+    already used for this request. A concurrent duplicate blocks on the
+    unique key until the first transaction finishes: it then replays the
+    committed response, or takes over the key if the first one rolled back.
+    """
+    now = datetime.now(tools.PH_TZ)
+    stmt = insert(IdempotencyKey).values(
+        user_email=user_email,
+        key=key,
+        request_hash=req_hash,
+        created_at=now,
+        expires_at=now + IDEMPOTENCY_TTL,
+    )
+    claimed = db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[IdempotencyKey.user_email, IdempotencyKey.key],
+            set_={
+                "request_hash": stmt.excluded.request_hash,
+                "response_status": None,
+                "response_body": None,
+                "created_at": stmt.excluded.created_at,
+                "expires_at": stmt.excluded.expires_at,
+            },
+            # An expired key may be reused for a new request
+            where=IdempotencyKey.expires_at < now,
+        ).returning(IdempotencyKey.key)
+    ).first()
+    if claimed:
+        return None
+
+    existing = db.query(IdempotencyKey).filter(
+        IdempotencyKey.user_email == user_email,
+        IdempotencyKey.key == key
+    ).first()
+    if existing.request_hash != req_hash:
+        raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+    if existing.response_body is None:
+        raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+
+    return JSONResponse(
+        content=json.loads(existing.response_body),
+        status_code=existing.response_status,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def store(db: Session, user_email: str, key: str, status_code: int, body):
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.user_email == user_email,
+        IdempotencyKey.key == key
+    ).update(
+        {IdempotencyKey.response_status: status_code, IdempotencyKey.response_body: json.dumps(body, default=str)},
+        synchronize_session=False,
+    )
+
+
+def purge_expired(db: Session):
+    db.query(IdempotencyKey).filter(
+        IdempotencyKey.expires_at < datetime.now(tools.PH_TZ)
+    ).delete(synchronize_session=False)
+    db.commit()
@@ -0,0 +1,115 @@
+import os
+import re
+import base64
+import binascii
+import hashlib
+import tempfile
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from database.MediaTable import MediaFile
+
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", os.path.join(os.path.dirname(os.path.abspath(__file__)), "media"))
+MEDIA_PREFIX = "/media/"
+MAX_MEDIA_BYTES = int(os.getenv("MAX_MEDIA_BYTES", 10 * 1024 * 1024))
+
+_DATA_URL = re.compile(r"^data:(?P<mime>[\w.+-]+/[\w.+-]+)?(?:;[^,]*)?;base64,(?P<data>.*)$", re.DOTALL)
+_HASH = re.compile(r"^[0-9a-f]{64}$")
+
+# Only raster formats are accepted; SVG and anything else that a browser
+# could run script from is refused. The type comes from the file's own
+# magic bytes, never from the data URL.
+IMAGE_TYPES = ("image/png", "image/jpeg", "image/webp", "image/gif")
+
+# content types never change for a given hash, so they are safe to keep in memory
+_content_types: dict[str, str] = {}
+
+
+def is_media_hash(value: str) -> bool:
+    return bool(_HASH.match(value))
+
+
+def sniff_image_type(data: bytes) -> str | None:
+    if data.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if data.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "image/gif"
+    return None
+
+
+def media_path(media_hash: str) -> str:
+    return os.path.join(MEDIA_ROOT, media_hash[:2], media_hash)
+
+
+def store_bytes(db: Session, data: bytes, content_type: str) -> str:
+    """
+    Write the bytes to disk under their sha256 and return the media reference.
+    Identical uploads resolve to the same file and row.
+    """
+    media_hash = hashlib.sha256(data).hexdigest()
+    path = media_path(media_hash)
+
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    db.execute(
+        insert(MediaFile)
+        .values(hash=media_hash, content_type=content_type, size=len(data))
+        .on_conflict_do_nothing(index_elements=[MediaFile.hash])
+    )
+    _content_types[media_hash] = content_type
+    return MEDIA_PREFIX + media_hash
+
+
+def store_image(db: Session, value: str | None) -> str | None:
+    """
+    Turn a base64 data URL into a /media/{hash} reference.
+    Empty values, existing references and plain URLs are returned unchanged.
+    Raises ValueError for malformed or oversized uploads.
+    """
+    if not value or not value.startswith("data:"):
+        return value
+
+    match = _DATA_URL.match(value)
+    if not match:
+        raise ValueError("Image must be a base64 data URL")
+
+    try:
+        data = base64.b64decode(match.group("data"), validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("Image data is not valid base64")
+
+    if not data:
+        raise ValueError("Image data is empty")
+    if len(data) > MAX_MEDIA_BYTES:
+        raise ValueError(f"Image is larger than {MAX_MEDIA_BYTES} bytes")
+
+    content_type = sniff_image_type(data)
+    if content_type is None:
+        raise ValueError("Only PNG, JPEG, WebP and GIF images are allowed")
+
+    return store_bytes(db, data, content_type)
+
+
+def get_content_type(db: Session, media_hash: str) -> str | None:
+    if media_hash in _content_types:
+        return _content_types[media_hash]
+
+    media = db.query(MediaFile).filter(MediaFile.hash == media_hash).first()
+    if not media:
+        return None
+
+    _content_types[media_hash] = media.content_type
+    return media.content_type
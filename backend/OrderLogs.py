@@ -0,0 +1,26 @@
+from sqlalchemy import select, insert
+from sqlalchemy.orm import Session
+from database.ProductTable import Orders, OrderItem, OrderLog
+
+
+def insert_order_logs(db: Session, order_ids: list[int]):
+    """
+    One INSERT ... SELECT logging every item of the orders with their current
+    status. Pending changes are flushed first so the log sees them.
+    """
+    db.flush()
+    db.execute(insert(OrderLog).from_select(
+        [
+            "order_id", "user_email", "created_at", "status", "estimated_delivery",
+            "house_number", "street", "barangay", "city", "province",
+            "product_id", "tile_name", "tile_category", "tile_type", "tile_image", "tile_price", "quantity",
+        ],
+        select(
+            Orders.id, Orders.user_email, Orders.created_at, Orders.status, Orders.estimated_delivery,
+            Orders.house_number, Orders.street, Orders.barangay, Orders.city, Orders.province,
+            OrderItem.product_id, OrderItem.tile_name, OrderItem.tile_category, OrderItem.tile_type,
+            OrderItem.tile_image, OrderItem.tile_price, OrderItem.quantity,
+        )
+        .join(OrderItem, OrderItem.order_id == Orders.id)
+        .where(Orders.id.in_(order_ids))
+    ))
@@ -0,0 +1,91 @@
+from collections import Counter
+from sqlalchemy import case, func, literal, select, union_all
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from database.ProductTable import Products, ProductFacet
+
+# (label, min inclusive, max exclusive); None means open ended
+PRICE_BUCKETS = [
+    ("0-100", 0, 100),
+    ("100-250", 100, 250),
+    ("250-500", 250, 500),
+    ("500-1000", 500, 1000),
+    ("1000-2500", 1000, 2500),
+    ("2500+", 2500, None),
+]
+
+
+def price_bucket(price: float | None) -> str | None:
+    if price is None:
+        return None
+    for label, low, high in PRICE_BUCKETS:
+        if price >= low and (high is None or price < high):
+            return label
+    return None
+
+
+def facet_keys(product: Products | None) -> list[tuple[str, str]]:
+    """
+    The facet values a product counts towards. Only non-archived, in-stock
+    products show up in the storefront navigation.
+    """
+    if product is None or product.is_archived or not product.tile_stock or product.tile_stock <= 0:
+        return []
+
+    keys = [
+        ("category", product.tile_category),
+        ("type", product.tile_type),
+        ("price", price_bucket(product.tile_price)),
+    ]
+    return [(facet, value) for facet, value in keys if value is not None]
+
+
+def facet_delta(before: list, after: list) -> Counter:
+    delta = Counter(after)
+    delta.subtract(Counter(before))
+    return delta
+
+
+def apply_facet_delta(db: Session, delta: Counter):
+    """
+    Add the delta to the stored counts inside the caller's transaction,
+    so the counts commit or roll back together with the product change.
+    """
+    rows = [{"facet": facet, "value": value, "count": n} for (facet, value), n in delta.items() if n]
+    if not rows:
+        return
+
+    stmt = insert(ProductFacet).values(rows)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[ProductFacet.facet, ProductFacet.value],
+        set_={"count": ProductFacet.count + stmt.excluded.count},
+    ))
+
+
+def rebuild_facets(db: Session):
+    """
+    Recompute every count from the products table. Used for the initial
+    backfill and to repair drift; request paths only apply deltas.
+    """
+    visible = (Products.is_archived.isnot(True), Products.tile_stock > 0)
+
+    conditions = []
+    for label, low, high in PRICE_BUCKETS:
+        condition = Products.tile_price >= low
+        if high is not None:
+            condition = condition & (Products.tile_price < high)
+        conditions.append((condition, label))
+    bucket = case(*conditions, else_=None)
+
+    counts = union_all(
+        *[
+            select(literal(facet).label("facet"), column.label("value"), func.count().label("count"))
+            .where(*visible, column.isnot(None))
+            .group_by(column)
+            for facet, column in (("category", Products.tile_category), ("type", Products.tile_type), ("price", bucket))
+        ]
+    )
+
+    db.query(ProductFacet).delete()
+    db.execute(insert(ProductFacet).from_select(["facet", "value", "count"], counts))
+    db.commit()
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, timedelta
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+from database.ProductTable import Orders
+from SalesStats import ph_today, range_totals, best_sellers
+import tools
+
+# Reports whose range includes today are only reused for this long
+LIVE_REPORT_TTL_SECONDS = int(os.getenv("LIVE_REPORT_TTL_SECONDS", "60"))
+PRECOMPUTE_INTERVAL_SECONDS = LIVE_REPORT_TTL_SECONDS
+
+
+def build_sales_totals(db: Session, start_date: date, end_date: date) -> dict:
+    """
+    The sales side of a report: totals and best sellers. Past days come from
+    the daily rollup and never change, so this is what gets cached.
+    """
+    # 📊 Total sales and items in range
+    total_items, total_sales = range_totals(db, start_date, end_date)
+
+    # 🏆 Best-selling products with total revenue
+    top_products = best_sellers(db, start_date, end_date)
+
+    return {
+        "total_sales": total_sales,
+        "total_items": total_items,
+        "best_sellers": [
+            {
+                "tile_name": name,
+                "total_sold": sold,
+                "total_revenue": revenue or 0
+            }
+            for name, sold, revenue in top_products
+        ],
+    }
+
+
+def count_orders(db: Session, start_date: date, end_date: date) -> int:
+    # 🧾 Orders can still be deleted after the fact, so they are always counted
+    # live; the created_at index keeps this a cheap range count
+    return (
+        db.query(func.count(Orders.id))
+        .filter(*tools.date_range(Orders.created_at, start_date, end_date))
+        .scalar()
+    )
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class ReportCache:
+    """
+    In-process cache for the sales side of reports keyed by (start_date, end_date).
+
+    Ranges that end before today can no longer change, so they are kept
+    until evicted; ranges that include today expire after LIVE_REPORT_TTL.
+    Concurrent requests for the same missing report wait for the one that
+    is already computing it instead of running the same aggregation again.
+    """
+
+    def __init__(self, max_entries: int = 256, live_ttl: int = LIVE_REPORT_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.live_ttl = live_ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._flights: dict = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_compute(self, key, compute, immutable: bool, refresh: bool = False):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not refresh and (entry["expires_at"] is None or entry["expires_at"] > time.monotonic()):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry["value"]
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                self.misses += 1
+                flight = self._flights[key] = _Flight()
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = compute()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                if flight.error is None:
+                    self._entries[key] = {
+                        "value": flight.value,
+                        "expires_at": None if immutable else time.monotonic() + self.live_ttl,
+                    }
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+                del self._flights[key]
+            flight.done.set()
+        return flight.value
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+            }
+
+
+report_cache = ReportCache()
+
+
+def cached_sales_totals(db: Session, start_date: date, end_date: date, refresh: bool = False) -> dict:
+    return report_cache.get_or_compute(
+        (start_date, end_date),
+        lambda: build_sales_totals(db, start_date, end_date),
+        immutable=end_date < ph_today(),
+        refresh=refresh,
+    )
+
+
+def get_sales_report(db: Session, start_date: date, end_date: date, refresh: bool = False) -> dict:
+    totals = cached_sales_totals(db, start_date, end_date, refresh)
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "total_sales": totals["total_sales"],
+        "total_orders": count_orders(db, start_date, end_date),
+        "total_items": totals["total_items"],
+        "best_sellers": totals["best_sellers"],
+    }
+
+
+def common_ranges(today: date) -> list[tuple[date, date]]:
+    """Last week (Mon-Sun), month to date and last month."""
+    this_week = today - timedelta(days=today.weekday())
+    this_month = today.replace(day=1)
+    last_month = (this_month - timedelta(days=1)).replace(day=1)
+    return [
+        (this_week - timedelta(days=7), this_week - timedelta(days=1)),
+        (this_month, today),
+        (last_month, this_month - timedelta(days=1)),
+    ]
+
+
+def precompute_reports(db: Session):
+    # Historical ranges are computed once; month to date is refreshed every round
+    today = ph_today()
+    for start_date, end_date in common_ranges(today):
+        cached_sales_totals(db, start_date, end_date, refresh=end_date >= today)
@@ -0,0 +1,233 @@
+from collections import defaultdict
+from datetime import datetime, date, time, timedelta
+from sqlalchemy import func, select, cast, DateTime
+from sqlalchemy.orm import Session
+from sqlalchemy.dialects.postgresql import insert
+from database.ProductTable import Sales, ProductSalesTotal, SalesDailyRollup, Products
+import tools
+
+# Calendar day of a sale in PH time, computed by Postgres
+SALES_DAY = func.date(func.timezone("Asia/Manila", Sales.created_at))
+
+
+def ph_today() -> date:
+    return datetime.now(tools.PH_TZ).date()
+
+
+def sale_day(sale) -> date:
+    # Sales not flushed yet have no created_at; they are stamped with "now"
+    created_at = getattr(sale, "created_at", None)
+    if created_at is None:
+        return ph_today()
+    return created_at.astimezone(tools.PH_TZ).date()
+
+
+def record_sales(db: Session, sales: list[Sales]):
+    """
+    Fold newly added Sales rows into the per-product counters and the daily
+    rollup. Must be called in the same transaction that inserts the sales so
+    everything commits together.
+    """
+    totals = defaultdict(lambda: [0, 0.0])
+    daily = {}
+    for sale in sales:
+        totals[sale.product_id][0] += sale.quantity
+        totals[sale.product_id][1] += sale.total_price
+        row = daily.setdefault((sale_day(sale), sale.product_id), [sale.tile_name, 0, 0.0])
+        row[1] += sale.quantity
+        row[2] += sale.total_price
+    if not totals:
+        return
+
+    stmt = insert(ProductSalesTotal).values([
+        {"product_id": product_id, "total_sold": sold, "total_revenue": revenue}
+        for product_id, (sold, revenue) in sorted(totals.items())
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[ProductSalesTotal.product_id],
+        set_={
+            "total_sold": ProductSalesTotal.total_sold + stmt.excluded.total_sold,
+            "total_revenue": ProductSalesTotal.total_revenue + stmt.excluded.total_revenue,
+        },
+    ))
+
+    stmt = insert(SalesDailyRollup).values([
+        {"day": day, "product_id": product_id, "tile_name": name, "quantity": quantity, "revenue": revenue}
+        for (day, product_id), (name, quantity, revenue) in sorted(daily.items())
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[SalesDailyRollup.day, SalesDailyRollup.product_id],
+        set_={
+            "tile_name": stmt.excluded.tile_name,
+            "quantity": SalesDailyRollup.quantity + stmt.excluded.quantity,
+            "revenue": SalesDailyRollup.revenue + stmt.excluded.revenue,
+        },
+    ))
+
+
+def rebuild_sales_totals(db: Session):
+    totals = select(
+        Sales.product_id,
+        func.sum(Sales.quantity),
+        func.sum(Sales.total_price),
+    ).group_by(Sales.product_id)
+
+    db.query(ProductSalesTotal).delete()
+    db.execute(insert(ProductSalesTotal).from_select(["product_id", "total_sold", "total_revenue"], totals))
+    db.commit()
+
+
+def rebuild_daily_rollup(db: Session):
+    daily = select(
+        SALES_DAY,
+        Sales.product_id,
+        func.max(Sales.tile_name),
+        func.sum(Sales.quantity),
+        func.sum(Sales.total_price),
+    ).group_by(SALES_DAY, Sales.product_id)
+
+    db.query(SalesDailyRollup).delete()
+    db.execute(insert(SalesDailyRollup).from_select(["day", "product_id", "tile_name", "quantity", "revenue"], daily))
+    db.commit()
+
+
+# ---------------- Reading ----------------
+# Past days come from the rollup; today is still aggregated from raw sales
+# rows, which is cheap through the created_at index.
+
+def todays_sales(db: Session, *columns):
+    return db.query(*columns).filter(*tools.date_range(Sales.created_at, ph_today(), ph_today()))
+
+
+def split_range(start_date: date | None, end_date: date | None):
+    """Return (last day to read from the rollup, whether today is in range)."""
+    today = ph_today()
+    if end_date is None or end_date >= today:
+        return today - timedelta(days=1), start_date is None or start_date <= today
+    return end_date, False
+
+
+def range_totals(db: Session, start_date: date | None, end_date: date | None) -> tuple[int, float]:
+    """(items sold, revenue) over the range; None bounds are open."""
+    last_day, with_today = split_range(start_date, end_date)
+    query = db.query(
+        func.coalesce(func.sum(SalesDailyRollup.quantity), 0),
+        func.coalesce(func.sum(SalesDailyRollup.revenue), 0),
+    ).filter(SalesDailyRollup.day <= last_day)
+    if start_date:
+        query = query.filter(SalesDailyRollup.day >= start_date)
+    quantity, revenue = query.one()
+
+    if with_today:
+        today_quantity, today_revenue = (
+            todays_sales(db, func.coalesce(func.sum(Sales.quantity), 0), func.coalesce(func.sum(Sales.total_price), 0))
+            .one()
+        )
+        quantity += today_quantity
+        revenue += today_revenue
+    return quantity, revenue
+
+
+def best_sellers(db: Session, start_date: date, end_date: date, limit: int = 5) -> list[tuple[str, int, float]]:
+    """Top products by items sold as (tile_name, total_sold, total_revenue)."""
+    last_day, with_today = split_range(start_date, end_date)
+    totals = defaultdict(lambda: [0, 0.0])
+    rows = (
+        db.query(SalesDailyRollup.tile_name, func.sum(SalesDailyRollup.quantity), func.sum(SalesDailyRollup.revenue))
+        .filter(SalesDailyRollup.day >= start_date, SalesDailyRollup.day <= last_day)
+        .group_by(SalesDailyRollup.tile_name)
+        .all()
+    )
+    if with_today:
+        rows += (
+            todays_sales(db, Sales.tile_name, func.sum(Sales.quantity), func.sum(Sales.total_price))
+            .group_by(Sales.tile_name)
+            .all()
+        )
+    for name, quantity, revenue in rows:
+        totals[name][0] += quantity
+        totals[name][1] += revenue or 0
+
+    ranked = sorted(totals.items(), key=lambda item: item[1][0], reverse=True)[:limit]
+    return [(name, sold, revenue) for name, (sold, revenue) in ranked]
+
+
+# ---------------- Time series ----------------
+MAX_HOURLY_DAYS = 31
+
+
+def bucket_starts(start_date: date, end_date: date, granularity: str) -> list:
+    """Every bucket between the dates, as date_trunc would label it in PH time."""
+    if granularity == "hour":
+        current = datetime.combine(start_date, time.min)
+        end = datetime.combine(end_date + timedelta(days=1), time.min)
+        step = lambda d: d + timedelta(hours=1)
+    else:
+        current, end = start_date, end_date + timedelta(days=1)
+        if granularity == "day":
+            step = lambda d: d + timedelta(days=1)
+        elif granularity == "week":
+            current -= timedelta(days=current.weekday())  # weeks start on Monday
+            step = lambda d: d + timedelta(days=7)
+        else:
+            current = current.replace(day=1)
+            step = lambda d: (d.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+    buckets = []
+    while current < end:
+        buckets.append(current)
+        current = step(current)
+    return buckets
+
+
+def sales_series(db: Session, start_date: date, end_date: date, granularity: str, group_by: str | None = None) -> dict:
+    """
+    Items sold and revenue per time bucket in one GROUP BY query, zero-filled,
+    optionally split per product or per category. Hourly buckets come from the
+    raw sales rows, coarser ones from the daily rollup.
+    """
+    if granularity == "hour":
+        bucket = func.date_trunc("hour", func.timezone("Asia/Manila", Sales.created_at))
+        product_id, tile_name, quantity, revenue = Sales.product_id, Sales.tile_name, Sales.quantity, Sales.total_price
+        filters = tools.date_range(Sales.created_at, start_date, end_date)
+    else:
+        bucket = func.date_trunc(granularity, cast(SalesDailyRollup.day, DateTime))
+        product_id, tile_name = SalesDailyRollup.product_id, SalesDailyRollup.tile_name
+        quantity, revenue = SalesDailyRollup.quantity, SalesDailyRollup.revenue
+        filters = [SalesDailyRollup.day >= start_date, SalesDailyRollup.day <= end_date]
+
+    if group_by == "product":
+        group_columns = [product_id, func.max(tile_name)]
+    elif group_by == "category":
+        group_columns = [func.coalesce(Products.tile_category, "Uncategorized")]
+    else:
+        group_columns = []
+
+    query = db.query(bucket, *group_columns, func.sum(quantity), func.sum(revenue)).filter(*filters)
+    if group_by == "category":
+        query = query.outerjoin(Products, Products.id == product_id)
+    query = query.group_by(bucket, *group_columns[:1])
+
+    buckets = bucket_starts(start_date, end_date, granularity)
+    index = {b: i for i, b in enumerate(buckets)}
+    series = {}
+    for row in query.all():
+        key = row[0] if granularity == "hour" else row[0].date()
+        if group_by == "product":
+            group, name = row[1], row[2]
+        elif group_by == "category":
+            group = name = row[1]
+        else:
+            group = name = "All"
+        entry = series.setdefault(group, {"key": group, "name": name, "quantity": [0] * len(buckets), "revenue": [0.0] * len(buckets)})
+        entry["quantity"][index[key]] += row[-2]
+        entry["revenue"][index[key]] += row[-1]
+
+    if not group_by and not series:
+        series["All"] = {"key": "All", "name": "All", "quantity": [0] * len(buckets), "revenue": [0.0] * len(buckets)}
+
+    return {
+        "granularity": granularity,
+        "buckets": [b.isoformat() for b in buckets],
+        "series": sorted(series.values(), key=lambda s: sum(s["revenue"]), reverse=True),
+    }
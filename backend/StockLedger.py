@@ -0,0 +1,154 @@
+import os
+from datetime import datetime
+from sqlalchemy import func, select, insert, case, literal, text
+from sqlalchemy.orm import Session
+from database.ProductTable import Products, StockRecord, InventorySnapshot
+import tools
+
+# Every change of tile_stock or reserved writes a StockRecord. On-hand stock
+# moves by new_stock - previous_stock; "reserve" and "release" entries leave
+# on-hand stock alone and move the reserved quantity by quantity_changed.
+RESERVED_SIGN = {"reserve": 1, "release": -1}
+
+SNAPSHOT_INTERVAL_SECONDS = int(os.getenv("INVENTORY_SNAPSHOT_SECONDS", 24 * 60 * 60))
+# How often the background job checks whether the newest snapshot is too old
+SNAPSHOT_CHECK_SECONDS = int(os.getenv("INVENTORY_SNAPSHOT_CHECK_SECONDS", 10 * 60))
+
+
+def stock_entry(product_id: int, change_type: str, previous_stock: int, new_stock: int, quantity: int | None = None) -> dict:
+    return {
+        "product_id": product_id,
+        "change_type": change_type,
+        "quantity_changed": new_stock - previous_stock if quantity is None else quantity,
+        "previous_stock": previous_stock,
+        "new_stock": new_stock,
+    }
+
+
+def reserved_entry(product_id: int, change_type: str, quantity: int, tile_stock: int) -> dict:
+    return stock_entry(product_id, change_type, tile_stock, tile_stock, quantity)
+
+
+def log_entries(db: Session, entries: list[dict]):
+    """Write ledger entries in the caller's transaction."""
+    if entries:
+        db.execute(insert(StockRecord), entries)
+
+
+def lock_ledger(db: Session):
+    # Waits for transactions that are still writing stock_records and holds
+    # off new ones until the caller commits
+    db.execute(text("LOCK TABLE stock_records IN SHARE ROW EXCLUSIVE MODE"))
+
+
+def take_snapshot(db: Session):
+    """
+    Copy every product's stock and reservations into one snapshot run,
+    together with the highest ledger id it already reflects. The ledger is
+    locked first, so no entry below that id can show up later.
+    """
+    lock_ledger(db)
+    taken_at = datetime.now(tools.PH_TZ)
+    last_record_id = select(func.coalesce(func.max(StockRecord.id), 0)).scalar_subquery()
+    db.execute(insert(InventorySnapshot).from_select(
+        ["product_id", "tile_stock", "reserved", "taken_at", "last_record_id"],
+        select(Products.id, Products.tile_stock, Products.reserved, literal(taken_at), last_record_id),
+    ))
+    db.commit()
+    return taken_at
+
+
+def stock_as_of(db: Session, at: datetime, product_id: int | None = None) -> dict | None:
+    """
+    Rebuild stock at a point in time from the latest snapshot run before it,
+    replaying only the ledger entries the snapshot had not seen yet. Returns
+    None when no snapshot is that old.
+    """
+    snapshot = (
+        db.query(InventorySnapshot.taken_at, InventorySnapshot.last_record_id)
+        .filter(InventorySnapshot.taken_at <= at)
+        .order_by(InventorySnapshot.taken_at.desc())
+        .first()
+    )
+    if snapshot is None:
+        return None
+    snapshot_at, last_record_id = snapshot
+
+    base = (
+        select(InventorySnapshot.product_id, InventorySnapshot.tile_stock, InventorySnapshot.reserved)
+        .where(InventorySnapshot.taken_at == snapshot_at)
+        .subquery()
+    )
+    replay = select(
+        StockRecord.product_id,
+        func.sum(StockRecord.new_stock - StockRecord.previous_stock).label("stock_delta"),
+        func.sum(case(
+            *[(StockRecord.change_type == change_type, StockRecord.quantity_changed * sign)
+              for change_type, sign in RESERVED_SIGN.items()],
+            else_=0,
+        )).label("reserved_delta"),
+        func.count().label("entries"),
+    ).where(StockRecord.id > last_record_id, StockRecord.created_at <= at)
+    if product_id is not None:
+        replay = replay.where(StockRecord.product_id == product_id)
+    replay = replay.group_by(StockRecord.product_id).subquery()
+
+    # Products created after the snapshot have no base row; their first
+    # ledger entry is in the replay window
+    tile_stock = func.coalesce(base.c.tile_stock, 0) + func.coalesce(replay.c.stock_delta, 0)
+    reserved = func.coalesce(base.c.reserved, 0) + func.coalesce(replay.c.reserved_delta, 0)
+    query = (
+        db.query(
+            Products.id, Products.tile_name,
+            tile_stock.label("tile_stock"), reserved.label("reserved"),
+            func.coalesce(replay.c.entries, 0).label("entries"),
+        )
+        .outerjoin(base, base.c.product_id == Products.id)
+        .outerjoin(replay, replay.c.product_id == Products.id)
+        .filter((base.c.product_id != None) | (replay.c.product_id != None))
+        .order_by(Products.id)
+    )
+    if product_id is not None:
+        query = query.filter(Products.id == product_id)
+
+    rows = query.all()
+    return {
+        "as_of": at,
+        "snapshot_taken_at": snapshot_at,
+        "replayed_entries": sum(row.entries for row in rows),
+        "products": [
+            {
+                "product_id": row.id,
+                "tile_name": row.tile_name,
+                "tile_stock": row.tile_stock,
+                "reserved": row.reserved,
+                "available": row.tile_stock - row.reserved,
+            }
+            for row in rows
+        ],
+    }
+
+
+def snapshot_due(db: Session) -> bool:
+    newest = db.query(func.max(InventorySnapshot.taken_at)).scalar()
+    return newest is None or (datetime.now(tools.PH_TZ) - newest).total_seconds() >= SNAPSHOT_INTERVAL_SECONDS
+
+
+def snapshot_if_due(db: Session):
+    """
+    Take a snapshot when the newest one is older than SNAPSHOT_INTERVAL_SECONDS.
+    Going by the table rather than an in-process timer means restarts and
+    several workers neither delay nor duplicate runs. The check itself takes
+    no lock; only the one worker that wins the advisory lock goes on to lock
+    the ledger and write the snapshot.
+    """
+    if not snapshot_due(db):
+        db.rollback()
+        return
+    won = db.query(func.pg_try_advisory_xact_lock(func.hashtext("inventory_snapshots"))).scalar()
+    # Another worker may have finished a snapshot since the first check
+    if not won or not snapshot_due(db):
+        db.rollback()
+        return
+    taken_at = take_snapshot(db)
+    print(f"✅ Inventory snapshot taken at {taken_at.isoformat()}")
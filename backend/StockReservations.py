@@ -0,0 +1,134 @@
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import func, update, values, column, Integer
+from sqlalchemy.orm import Session
+from database.ProductTable import Products, StockReservation, Orders, OrderStatus
+import tools
+import StockLedger
+import OrderLogs
+
+# Pending orders hold their stock this long before the sweeper rejects them
+RESERVATION_TTL = timedelta(hours=int(os.getenv("RESERVATION_TTL_HOURS", 48)))
+SWEEP_INTERVAL_SECONDS = int(os.getenv("RESERVATION_SWEEP_SECONDS", 60))
+
+
+def reserve(db: Session, order_id: int, quantities: dict[int, int]) -> list[int]:
+    """
+    Reserve stock for an order with one conditional UPDATE:
+        reserved = reserved + n WHERE tile_stock - reserved >= n
+    Returns the product IDs that did not have enough available stock; in that
+    case nothing should be committed and the caller must roll back.
+    """
+    wanted = values(column("product_id", Integer), column("quantity", Integer), name="wanted").data(
+        sorted(quantities.items())
+    )
+    on_hand = dict(db.execute(
+        update(Products)
+        .values(reserved=Products.reserved + wanted.c.quantity)
+        .where(
+            Products.id == wanted.c.product_id,
+            Products.tile_stock - Products.reserved >= wanted.c.quantity,
+        )
+        .returning(Products.id, Products.tile_stock)
+    ).all())
+
+    failed = [product_id for product_id in quantities if product_id not in on_hand]
+    if failed:
+        return failed
+    StockLedger.log_entries(db, [
+        StockLedger.reserved_entry(product_id, "reserve", quantity, on_hand[product_id])
+        for product_id, quantity in sorted(quantities.items())
+    ])
+
+    expires_at = datetime.now(tools.PH_TZ) + RESERVATION_TTL
+    db.add_all([
+        StockReservation(order_id=order_id, product_id=product_id, quantity=quantity, expires_at=expires_at)
+        for product_id, quantity in quantities.items()
+    ])
+    return []
+
+
+def held_quantities(db: Session, order_ids: list[int]) -> dict[int, int]:
+    return dict(
+        db.query(StockReservation.product_id, func.sum(StockReservation.quantity))
+        .filter(StockReservation.order_id.in_(order_ids))
+        .group_by(StockReservation.product_id)
+        .all()
+    )
+
+
+def drop(db: Session, order_ids: list[int]):
+    db.query(StockReservation).filter(StockReservation.order_id.in_(order_ids)).delete(synchronize_session=False)
+
+
+def release(db: Session, order_ids: list[int]) -> dict[int, int]:
+    """Give the reserved quantity of the orders back to available stock."""
+    held = held_quantities(db, order_ids)
+    if held:
+        released = values(column("product_id", Integer), column("quantity", Integer), name="released").data(
+            sorted(held.items())
+        )
+        on_hand = dict(db.execute(
+            update(Products)
+            .values(reserved=Products.reserved - released.c.quantity)
+            .where(Products.id == released.c.product_id)
+            .returning(Products.id, Products.tile_stock)
+        ).all())
+        StockLedger.log_entries(db, [
+            StockLedger.reserved_entry(product_id, "release", quantity, on_hand[product_id])
+            for product_id, quantity in sorted(held.items()) if product_id in on_hand
+        ])
+    drop(db, order_ids)
+    return held
+
+
+def keep_until_shipped(db: Session, order_ids: list[int]):
+    """Approved orders keep their reservation until they ship or are rejected."""
+    db.query(StockReservation).filter(StockReservation.order_id.in_(order_ids)).update(
+        {StockReservation.expires_at: None}, synchronize_session=False
+    )
+
+
+def sweep_expired(db: Session, batch_size: int = 500) -> int:
+    """
+    Reject pending orders whose reservation expired and release their stock.
+    SKIP LOCKED lets several workers sweep at once without blocking each other
+    or an admin who is updating the same order.
+    """
+    now = datetime.now(tools.PH_TZ)
+    expired = (
+        db.query(StockReservation.order_id)
+        .filter(StockReservation.expires_at < now)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    order_ids = sorted({order_id for (order_id,) in expired})
+    if not order_ids:
+        db.rollback()
+        return 0
+
+    orders = (
+        db.query(Orders)
+        .filter(Orders.id.in_(order_ids), Orders.status == OrderStatus.Pending)
+        .order_by(Orders.id)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+    if not orders:
+        db.rollback()
+        return 0
+
+    release(db, [order.id for order in orders])
+    for order in orders:
+        order.status = OrderStatus.Rejected
+    OrderLogs.insert_order_logs(db, [order.id for order in orders])
+
+    db.commit()
+    return len(orders)
+
+
+def sweep_and_report(db: Session):
+    expired = sweep_expired(db)
+    if expired:
+        print(f"✅ Released stock of {expired} expired pending orders")
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, String, DateTime, Text
+from datetime import datetime
+from DatabaseConnector import Base
+import tools
+
+class IdempotencyKey(Base):
+    __tablename__ = "idempotency_keys"
+
+    user_email = Column(String, primary_key=True)
+    key = Column(String(255), primary_key=True)
+    request_hash = Column(String(64), nullable=False)
+    response_status = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(tools.PH_TZ))
+    # Purged by the background job once passed
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
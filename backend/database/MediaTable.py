@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+from DatabaseConnector import Base
+import tools
+
+class MediaFile(Base):
+    __tablename__ = "media_files"
+
+    # sha256 of the decoded bytes, also the file name on disk
+    hash = Column(String(64), primary_key=True)
+    content_type = Column(String, nullable=False)
+    size = Column(Integer, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(tools.PH_TZ))
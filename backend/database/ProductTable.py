@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Enum,Boolean
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Date, Enum,Boolean, Index, func, literal_column, text
 from sqlalchemy.orm import relationship
 from DatabaseConnector import Base
 from datetime import datetime
@@ -13,6 +13,21 @@ class OrderStatus(enum.Enum):
     Rejected = "Rejected"
 
 # ---------------- PRODUCT ----------------
+# Weighted full-text document for product search
+def _weighted(column, weight):
+    return func.setweight(
+        func.to_tsvector(literal_column("'english'::regconfig"), func.coalesce(column, literal_column("''"))),
+        literal_column(f"'{weight}'"),
+    )
+
+def search_vector(name, category, type_, description):
+    return (
+        _weighted(name, "A")
+        .op("||")(_weighted(category, "B"))
+        .op("||")(_weighted(type_, "B"))
+        .op("||")(_weighted(description, "C"))
+    )
+
 class Products(Base):
     __tablename__ = "products"
 
@@ -24,6 +39,8 @@ class Products(Base):
     tile_description = Column(String, nullable=True)
     tile_price = Column(Float, nullable=False)
     tile_stock = Column(Integer, default=0)
+    # Quantity held by open orders (see StockReservations.py); available = tile_stock - reserved
+    reserved = Column(Integer, nullable=False, default=0, server_default="0")
     is_archived = Column(Boolean, default=False)
 
     # Relationships
@@ -31,6 +48,20 @@ class Products(Base):
     order_items = relationship("OrderItem", back_populates="product", cascade="all, delete-orphan")
     stock_records = relationship("StockRecord", back_populates="product", cascade="all, delete-orphan")
 
+    # Keyset pagination indexes for the catalog listing (see routers/ProductManagement.py)
+    __table_args__ = (
+        Index("ix_products_archived_id", "is_archived", "id"),
+        Index("ix_products_archived_category_type_id", "is_archived", "tile_category", "tile_type", "id"),
+        Index("ix_products_archived_price_id", "is_archived", "tile_price", "id"),
+        Index("ix_products_archived_name_id", "is_archived", "tile_name", "id"),
+        # Full-text search (see migrations/ProductSearchIndexes.py)
+        Index("ix_products_search", search_vector(tile_name, tile_category, tile_type, tile_description), postgresql_using="gin"),
+    )
+
+
+# Same expression as ix_products_search, so the planner can use the index
+PRODUCT_SEARCH_VECTOR = search_vector(Products.tile_name, Products.tile_category, Products.tile_type, Products.tile_description)
+
 
 # ---------------- CART ----------------
 class Carts(Base):
@@ -43,6 +74,11 @@ class Carts(Base):
 
     product = relationship("Products", back_populates="cart_items")
 
+    # One line per product per user; add_to_cart upserts against this
+    __table_args__ = (
+        Index("uq_cart_user_product", "user_email", "product_id", unique=True),
+    )
+
 
 # ---------------- ORDER ----------------
 class Orders(Base):
@@ -63,13 +99,21 @@ class Orders(Base):
 
     items = relationship("OrderItem", back_populates="order", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_orders_user_status_created", "user_email", "status", "created_at"),
+        Index("ix_orders_status_created_id", "status", "created_at", "id"),
+        Index("ix_orders_created_id", "created_at", "id"),
+        # Case-insensitive customer email prefix filter in the admin order listing
+        Index("ix_orders_email_lower_prefix", text("lower(user_email) text_pattern_ops")),
+    )
+
 
 # ---------------- ORDER ITEM ----------------
 class OrderItem(Base):
     __tablename__ = "order_items"
 
     id = Column(Integer, primary_key=True, index=True)
-    order_id = Column(Integer, ForeignKey("orders.id"))
+    order_id = Column(Integer, ForeignKey("orders.id"), index=True)
     product_id = Column(Integer, ForeignKey("products.id"))
     quantity = Column(Integer, default=1)
 
@@ -111,6 +155,10 @@ class OrderLog(Base):
     tile_price = Column(Float, nullable=False)
     quantity = Column(Integer, nullable=False)
 
+    __table_args__ = (
+        Index("ix_order_logs_user_created", "user_email", "created_at"),
+    )
+
 
 # ---------------- SALES ----------------
 class Sales(Base):
@@ -126,13 +174,17 @@ class Sales(Base):
     total_price = Column(Float, nullable=False)
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(tools.PH_TZ))
 
+    __table_args__ = (
+        Index("ix_sales_created_at", "created_at"),
+    )
+
 # ---------------- STOCK RECORD ----------------
 class StockRecord(Base):
     __tablename__ = "stock_records"
 
     id = Column(Integer, primary_key=True, index=True)
     product_id = Column(Integer, ForeignKey("products.id"), nullable=False)
-    change_type = Column(String, nullable=False)  # "add" or "update"
+    change_type = Column(String, nullable=False)  # "add", "update", "initial", "ship", "reserve" or "release"
     quantity_changed = Column(Integer, nullable=False)
     previous_stock = Column(Integer, nullable=False)
     new_stock = Column(Integer, nullable=False)  
@@ -140,3 +192,67 @@ class StockRecord(Base):
 
     # Relationship
     product = relationship("Products", back_populates="stock_records")
+
+    __table_args__ = (
+        Index("ix_stock_records_product_created", "product_id", "created_at"),
+        Index("ix_stock_records_created_id", "created_at", "id"),
+    )
+
+# ---------------- PRODUCT FACETS ----------------
+class ProductFacet(Base):
+    __tablename__ = "product_facets"
+
+    # facet is "category", "type" or "price"; value is the category, type or price bucket label
+    facet = Column(String, primary_key=True)
+    value = Column(String, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
+# ---------------- PRODUCT SALES COUNTER ----------------
+class ProductSalesTotal(Base):
+    __tablename__ = "product_sales_totals"
+
+    # Running totals kept in step with the sales table (see SalesStats.py)
+    product_id = Column(Integer, primary_key=True)
+    total_sold = Column(Integer, nullable=False, default=0)
+    total_revenue = Column(Float, nullable=False, default=0)
+
+# ---------------- SALES DAILY ROLLUP ----------------
+class SalesDailyRollup(Base):
+    __tablename__ = "sales_daily_rollup"
+
+    # Sales summed per PH calendar day and product (see SalesStats.py)
+    day = Column(Date, primary_key=True)
+    product_id = Column(Integer, primary_key=True)
+    tile_name = Column(String, nullable=False)
+    quantity = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0)
+
+# ---------------- INVENTORY SNAPSHOT ----------------
+class InventorySnapshot(Base):
+    __tablename__ = "inventory_snapshots"
+
+    # Periodic copy of every product's stock; point-in-time queries start from
+    # the latest run and replay stock_records after it (see StockLedger.py)
+    id = Column(Integer, primary_key=True)
+    product_id = Column(Integer, nullable=False)
+    tile_stock = Column(Integer, nullable=False)
+    reserved = Column(Integer, nullable=False)
+    taken_at = Column(DateTime(timezone=True), nullable=False)
+    # Highest stock_records.id already reflected in this run; replay starts after it
+    last_record_id = Column(Integer, nullable=False, server_default="0")
+
+    __table_args__ = (
+        Index("ix_inventory_snapshots_taken_product", "taken_at", "product_id"),
+    )
+
+# ---------------- STOCK RESERVATION ----------------
+class StockReservation(Base):
+    __tablename__ = "stock_reservations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    order_id = Column(Integer, ForeignKey("orders.id", ondelete="CASCADE"), nullable=False, index=True)
+    product_id = Column(Integer, ForeignKey("products.id", ondelete="CASCADE"), nullable=False)
+    quantity = Column(Integer, nullable=False)
+    # Pending orders release their stock after this; None once approved
+    expires_at = Column(DateTime(timezone=True), nullable=True, index=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(tools.PH_TZ))
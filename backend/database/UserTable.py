@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey,Boolean
+from sqlalchemy import Column, Integer, String, DateTime, Enum, ForeignKey,Boolean, Index, text
 from sqlalchemy.orm import relationship
 from DatabaseConnector import Base
 import enum
@@ -22,6 +22,11 @@ class User(Base):
     addresses = relationship("Address", back_populates="user", cascade="all, delete-orphan")
     profile_image = relationship("ProfileImage", back_populates="user", uselist=False, cascade="all, delete-orphan")
 
+    # Case-insensitive email prefix search in the admin user directory
+    __table_args__ = (
+        Index("ix_users_email_lower_prefix", text("lower(email) text_pattern_ops")),
+    )
+
 class Address(Base):
     __tablename__ = "addresses"
     
@@ -35,7 +40,12 @@ class Address(Base):
     is_active = Column(Boolean, default=False)
 
     user = relationship("User", back_populates="addresses")
-    
+
+    # Only active addresses are looked up by user (admin user directory)
+    __table_args__ = (
+        Index("ix_addresses_user_active", "user_id", postgresql_where=is_active.is_(True)),
+    )
+
 
 class ProfileImage(Base):
     __tablename__ = "profile_images"
@@ -2,6 +2,11 @@ from fastapi import FastAPI
 from Api import include_routers
 from DatabaseConnector import Base,engine
 from fastapi.middleware.cors import CORSMiddleware
+import StockReservations
+import Idempotency
+import SalesReports
+import StockLedger
+from BackgroundJobs import run_periodically
 import os
 import uvicorn
 
@@ -16,10 +21,18 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Idempotent-Replayed"],
 )
 
 include_routers(app)
 
+@app.on_event("startup")
+def start_background_jobs():
+    run_periodically("reservation-sweeper", StockReservations.SWEEP_INTERVAL_SECONDS, StockReservations.sweep_and_report)
+    run_periodically("idempotency-purge", Idempotency.PURGE_INTERVAL_SECONDS, Idempotency.purge_expired)
+    run_periodically("sales-report-precompute", SalesReports.PRECOMPUTE_INTERVAL_SECONDS, SalesReports.precompute_reports)
+    run_periodically("inventory-snapshot", StockLedger.SNAPSHOT_CHECK_SECONDS, StockLedger.snapshot_if_due)
+
 @app.get("/")
 def read_root():
     return {"message": "Hello, FastAPI!"}
@@ -0,0 +1,19 @@
+"""
+Adds the indexes behind the paginated admin order listing: orders by
+(status, created_at, id) for status filters, by (created_at, id) for
+the unfiltered newest/oldest pages and by lower(user_email) for the
+customer prefix filter.
+
+Run from the backend folder:
+    python -m migrations.AdminOrderIndexes
+"""
+from migrations import create_indexes
+from database.ProductTable import Orders
+
+
+def upgrade():
+    create_indexes(*Orders.__table__.indexes)
+
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,18 @@
+"""
+Adds the indexes behind the paginated admin user directory: a partial
+index on addresses(user_id) WHERE is_active for joining each user's active
+address, and lower(email) text_pattern_ops for email prefix search.
+
+Run from the backend folder:
+    python -m migrations.AdminUserIndexes
+"""
+from migrations import create_indexes
+from database.UserTable import User, Address
+
+
+def upgrade():
+    create_indexes(*User.__table__.indexes, *Address.__table__.indexes)
+
+
+if __name__ == "__main__":
+    upgrade()
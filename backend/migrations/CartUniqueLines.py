@@ -0,0 +1,44 @@
+"""
+Merges duplicate (user_email, product_id) cart lines into one, then adds the
+unique index that add_to_cart's upsert relies on.
+
+Run from the backend folder:
+    python -m migrations.CartUniqueLines
+"""
+from sqlalchemy import text
+from DatabaseConnector import SessionLocal
+from migrations import create_indexes
+from database.ProductTable import Carts
+
+
+def merge_duplicates():
+    db = SessionLocal()
+    try:
+        db.execute(text("""
+            WITH merged AS (
+                SELECT MIN(id) AS keep_id, user_email, product_id, SUM(quantity) AS quantity
+                FROM cart
+                GROUP BY user_email, product_id
+                HAVING COUNT(*) > 1
+            ),
+            updated AS (
+                UPDATE cart SET quantity = merged.quantity
+                FROM merged WHERE cart.id = merged.keep_id
+            )
+            DELETE FROM cart USING merged
+            WHERE cart.user_email = merged.user_email
+              AND cart.product_id = merged.product_id
+              AND cart.id <> merged.keep_id
+        """))
+        db.commit()
+    finally:
+        db.close()
+
+
+def upgrade():
+    merge_duplicates()
+    create_indexes(*[index for index in Carts.__table__.indexes if index.name == "uq_cart_user_product"])
+
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,29 @@
+"""
+Creates inventory_snapshots and takes the first snapshot of every product.
+Point-in-time inventory queries can only go back to this first snapshot;
+from then on every stock and reservation change is written to
+stock_records and a new snapshot is taken periodically.
+
+Run from the backend folder:
+    python -m migrations.InventorySnapshotsMigration
+"""
+from sqlalchemy import text
+from DatabaseConnector import Base, SessionLocal, engine
+from StockLedger import take_snapshot
+
+
+def upgrade():
+    Base.metadata.create_all(bind=engine)
+    # Tables created before snapshots recorded their last ledger id
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE inventory_snapshots ADD COLUMN IF NOT EXISTS last_record_id INTEGER NOT NULL DEFAULT 0"))
+    db = SessionLocal()
+    try:
+        taken_at = take_snapshot(db)
+        print(f"✅ First inventory snapshot taken at {taken_at.isoformat()}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    upgrade()
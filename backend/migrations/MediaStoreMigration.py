@@ -0,0 +1,59 @@
+"""
+One-off migration that moves base64 data URLs out of products, order_items
+and order_logs into the media store, leaving /media/{hash} references behind.
+
+Run from the backend folder:
+    python -m migrations.MediaStoreMigration
+"""
+from DatabaseConnector import Base, SessionLocal, engine
+from database.ProductTable import Products, OrderItem, OrderLog
+import MediaStore
+
+BATCH_SIZE = 200
+
+
+def migrate_table(db, model) -> int:
+    migrated = 0
+    last_id = 0
+
+    while True:
+        rows = (
+            db.query(model.id, model.tile_image)
+            .filter(model.id > last_id, model.tile_image.like("data:%"))
+            .order_by(model.id)
+            .limit(BATCH_SIZE)
+            .all()
+        )
+        if not rows:
+            break
+
+        for row_id, tile_image in rows:
+            try:
+                ref = MediaStore.store_image(db, tile_image)
+            except ValueError as e:
+                print(f"⚠️ Skipped {model.__tablename__} #{row_id}: {e}")
+                continue
+            db.query(model).filter(model.id == row_id).update(
+                {model.tile_image: ref}, synchronize_session=False
+            )
+            migrated += 1
+
+        db.commit()
+        last_id = rows[-1][0]
+
+    return migrated
+
+
+def upgrade():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        for model in (Products, OrderItem, OrderLog):
+            count = migrate_table(db, model)
+            print(f"✅ {model.__tablename__}: {count} images moved to the media store")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,18 @@
+"""
+Adds the indexes behind paginated customer order history: orders by
+(user_email, status, created_at), order_logs by (user_email, created_at)
+and order_items by order_id for loading items of a page of orders.
+
+Run from the backend folder:
+    python -m migrations.OrderHistoryIndexes
+"""
+from migrations import create_indexes
+from database.ProductTable import Orders, OrderItem, OrderLog
+
+
+def upgrade():
+    create_indexes(*Orders.__table__.indexes, *OrderItem.__table__.indexes, *OrderLog.__table__.indexes)
+
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,16 @@
+"""
+Adds the composite indexes behind keyset pagination of the product catalog.
+
+Run from the backend folder:
+    python -m migrations.ProductCatalogIndexes
+"""
+from migrations import create_indexes
+from database.ProductTable import Products
+
+
+def upgrade():
+    create_indexes(*Products.__table__.indexes)
+
+
+if __name__ == "__main__":
+    upgrade()
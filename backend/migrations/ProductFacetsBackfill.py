@@ -0,0 +1,23 @@
+"""
+Creates product_facets and fills it from the current catalog. Safe to re-run
+whenever the counts need repairing.
+
+Run from the backend folder:
+    python -m migrations.ProductFacetsBackfill
+"""
+from DatabaseConnector import Base, SessionLocal, engine
+from ProductFacets import rebuild_facets
+
+
+def upgrade():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        rebuild_facets(db)
+        print("✅ product_facets rebuilt")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    upgrade()
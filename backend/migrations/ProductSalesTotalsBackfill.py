@@ -0,0 +1,23 @@
+"""
+Creates product_sales_totals and fills it from the sales table. Safe to
+re-run; the counters are rebuilt from scratch.
+
+Run from the backend folder:
+    python -m migrations.ProductSalesTotalsBackfill
+"""
+from DatabaseConnector import Base, SessionLocal, engine
+from SalesStats import rebuild_sales_totals
+
+
+def upgrade():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        rebuild_sales_totals(db)
+        print("✅ product_sales_totals rebuilt")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,34 @@
+"""
+Adds the indexes behind GET /product/search: a GIN index over the weighted
+full-text document and a trigram GIN index on tile_name for typo tolerance.
+Both are built CONCURRENTLY.
+
+Run from the backend folder:
+    python -m migrations.ProductSearchIndexes
+"""
+from sqlalchemy import Index, text
+from DatabaseConnector import engine
+from migrations import create_indexes
+from database.ProductTable import Products
+
+
+def upgrade():
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
+    # The full-text index is declared on the model; the trigram one stays here
+    # because it needs pg_trgm, which create_all() cannot assume
+    search_index = next(index for index in Products.__table__.indexes if index.name == "ix_products_search")
+    create_indexes(
+        search_index,
+        Index(
+            "ix_products_name_trgm",
+            Products.tile_name,
+            postgresql_using="gin",
+            postgresql_ops={"tile_name": "gin_trgm_ops"},
+        ),
+    )
+
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,27 @@
+"""
+Creates sales_daily_rollup and fills it from the sales table, and adds the
+sales(created_at) index used to aggregate today's raw rows. Safe to re-run;
+the rollup is rebuilt from scratch.
+
+Run from the backend folder:
+    python -m migrations.SalesDailyRollupBackfill
+"""
+from DatabaseConnector import Base, SessionLocal, engine
+from database.ProductTable import Sales
+from migrations import create_indexes
+from SalesStats import rebuild_daily_rollup
+
+
+def upgrade():
+    Base.metadata.create_all(bind=engine)
+    create_indexes(*Sales.__table__.indexes)
+    db = SessionLocal()
+    try:
+        rebuild_daily_rollup(db)
+        print("✅ sales_daily_rollup rebuilt")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    upgrade()
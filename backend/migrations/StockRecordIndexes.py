@@ -0,0 +1,18 @@
+"""
+Adds the indexes behind the paginated stock-record history:
+stock_records by (product_id, created_at) for per-product audits and by
+(created_at, id) for the unfiltered newest-first pages.
+
+Run from the backend folder:
+    python -m migrations.StockRecordIndexes
+"""
+from migrations import create_indexes
+from database.ProductTable import StockRecord
+
+
+def upgrade():
+    create_indexes(*StockRecord.__table__.indexes)
+
+
+if __name__ == "__main__":
+    upgrade()
@@ -0,0 +1,63 @@
+"""
+Adds products.reserved and the stock_reservations table, then reserves stock
+for orders that are already open: pending orders get a fresh expiry, approved
+orders hold theirs until shipped. Run once.
+
+If open orders already need more than a product has in stock, nothing is
+written: the products and their orders are listed so they can be restocked
+or rejected first, then the migration is run again.
+
+Run from the backend folder:
+    python -m migrations.StockReservationsMigration
+"""
+from datetime import datetime
+from sqlalchemy import text
+from DatabaseConnector import Base, SessionLocal, engine
+from database.ProductTable import StockReservation
+from StockReservations import RESERVATION_TTL
+import tools
+
+
+def upgrade():
+    with engine.begin() as conn:
+        conn.execute(text("ALTER TABLE products ADD COLUMN IF NOT EXISTS reserved INTEGER NOT NULL DEFAULT 0"))
+    Base.metadata.create_all(bind=engine, tables=[StockReservation.__table__])
+
+    db = SessionLocal()
+    try:
+        db.execute(text("""
+            INSERT INTO stock_reservations (order_id, product_id, quantity, expires_at, created_at)
+            SELECT o.id, i.product_id, i.quantity,
+                   CASE WHEN o.status = 'Pending' THEN CAST(:expires_at AS TIMESTAMPTZ) END,
+                   CAST(:now AS TIMESTAMPTZ)
+            FROM orders o
+            JOIN order_items i ON i.order_id = o.id
+            WHERE o.status IN ('Pending', 'Approved')
+              AND NOT EXISTS (SELECT 1 FROM stock_reservations r WHERE r.order_id = o.id)
+        """), {"now": datetime.now(tools.PH_TZ), "expires_at": datetime.now(tools.PH_TZ) + RESERVATION_TTL})
+        db.execute(text("""
+            UPDATE products SET reserved = COALESCE(
+                (SELECT SUM(quantity) FROM stock_reservations r WHERE r.product_id = products.id), 0
+            )
+        """))
+        over_reserved = db.execute(text("""
+            SELECT p.id, p.tile_name, COALESCE(p.tile_stock, 0), p.reserved,
+                   (SELECT string_agg(DISTINCT r.order_id::text, ', ') FROM stock_reservations r WHERE r.product_id = p.id)
+            FROM products p
+            WHERE p.reserved > COALESCE(p.tile_stock, 0)
+            ORDER BY p.id
+        """)).all()
+        if over_reserved:
+            db.rollback()
+            for product_id, name, stock, reserved, order_ids in over_reserved:
+                print(f"❌ Product #{product_id} '{name}': {reserved} reserved by open orders, {stock} in stock (orders {order_ids})")
+            raise SystemExit("Open orders exceed stock; restock or reject them and run the migration again")
+
+        db.commit()
+        print("✅ Reservations created for open orders")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    upgrade()
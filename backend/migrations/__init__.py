@@ -0,0 +1,15 @@
+from sqlalchemy.schema import CreateIndex
+from DatabaseConnector import engine
+
+
+def create_indexes(*indexes):
+    """
+    Build indexes declared on the models for tables that already exist.
+    create_all() only adds indexes when it creates the table itself.
+    Indexes are built CONCURRENTLY so writes are not blocked meanwhile.
+    """
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        for index in indexes:
+            index.dialect_options["postgresql"]["concurrently"] = True
+            conn.execute(CreateIndex(index, if_not_exists=True))
+            print(f"✅ {index.name}")
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional
 from datetime import datetime
 
@@ -15,6 +15,12 @@ class OrderAdminUpdate(BaseModel):
     estimated_delivery: Optional[datetime] = None
 
 
+class BulkOrderAdminUpdate(BaseModel):
+    order_ids: list[int] = Field(..., min_length=1, max_length=500)
+    status: str
+    estimated_delivery: Optional[datetime] = None
+
+
 class OrderAdminResponse(BaseModel): 
     order_id: int
     product_id: int
@@ -17,6 +17,11 @@ class ProductResponse(AddNewProduct):
     id: int
     pass
 
+class ProductSearchResult(ProductResponse):
+    rank: float
+    tile_name_highlight: str
+    tile_description_highlight: Optional[str] = None
+
 class UpdateProduct(BaseModel):
     tile_image: Optional[str] = None
     tile_category: Optional[str] = None
@@ -33,6 +38,10 @@ class Orders(BaseModel):
     quantity: int
     estimated_delivery: Optional[datetime] = None
 
+class CheckoutRequest(BaseModel):
+    # Cart lines to check out; None checks out the whole cart
+    product_ids: Optional[list[int]] = None
+
 class DeliveryAddress(BaseModel):
     house_number: Optional[str]
     street: Optional[str]
@@ -61,6 +70,12 @@ class AddCartItem(BaseModel):
     quantity: int = 1
 
 
+class CartBulkUpdate(BaseModel):
+    items: list[AddCartItem] = []  # quantities to set; 0 or less removes the line
+    remove: list[int] = []
+    clear: bool = False
+
+
 class CartItemResponse(BaseModel):
     product_id: int
     tile_image: str
@@ -70,3 +85,12 @@ class CartItemResponse(BaseModel):
     tile_price: float
     tile_stock: int
     quantity: int
+    line_total: float = 0
+    stock_shortfall: bool = False
+
+
+class CartResponse(BaseModel):
+    items: list[CartItemResponse]
+    subtotal: float
+    item_count: int
+    has_stock_shortfall: bool
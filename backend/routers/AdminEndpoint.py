@@ -1,13 +1,25 @@
-from fastapi import APIRouter, Depends, Response, HTTPException, Cookie
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, Response, HTTPException, Cookie, Query, Header, Request
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session, selectinload
 from DatabaseConnector import get_db
-from models.AdminModel import AdminLogin,ChangePasswordRequest,OrderAdminUpdate,OrderAdminResponse,ProductStockUpdate
+from models.AdminModel import AdminLogin,ChangePasswordRequest,OrderAdminUpdate,OrderAdminResponse,ProductStockUpdate,BulkOrderAdminUpdate
 from database.AdminTable import Admin,RecentActivity
-from database.UserTable import User, UserStatus
-from database.ProductTable import Orders as TableOrders, OrderItem,OrderStatus,OrderLog,Sales,Products,StockRecord
+from database.UserTable import User, UserStatus, Address
+from database.ProductTable import Orders as TableOrders, OrderItem,OrderStatus,OrderLog,Sales,Products,StockRecord,StockReservation
 from datetime import datetime, date, timedelta
-from sqlalchemy import func
+from sqlalchemy import func, insert, select, literal
+from collections import Counter, defaultdict
 import tools
+import Exports
+from CatalogCache import catalog_cache
+from ProductFacets import facet_keys, facet_delta, apply_facet_delta
+from SalesStats import record_sales, ph_today, range_totals, sales_series, MAX_HOURLY_DAYS
+from SalesReports import get_sales_report, report_cache
+import StockReservations
+import StockLedger
+import OrderLogs
+import Forecasting
+import ActivityFeed
 router = APIRouter(prefix="/admin",tags=["admin"])
 
 @router.post("/login")
@@ -67,26 +79,52 @@ def change_admin_password(
     return {"message": "Password changed successfully"}
 
 @router.get("/users")
-def get_all_users(admin_email: str | None = Cookie(default=None), db: Session = Depends(get_db)):
+def get_all_users(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    search: str | None = None,
+    # Takes the status as this endpoint returns it ("Active"/"Banned"), case-insensitively
+    status: str | None = Query(None, pattern="(?i)^(active|banned)$"),
+    admin_email: str | None = Cookie(default=None),
+    db: Session = Depends(get_db),
+):
     if not admin_email:
         raise HTTPException(status_code=401, detail="Not logged in")
 
-    users = db.query(User).all()
-
-    result = []
-    for user in users:
-        active_addresses = [addr for addr in user.addresses if addr.is_active]
-        result.append({
-            "id": user.id,
-            "email": user.email,
-            "status": "Banned" if user.status == UserStatus.Banned else "Active",
-            "deliveryLocation": ", ".join([
-                f"{addr.house_number}, {addr.street}, {addr.barangay}, {addr.city}, {addr.province}"
-                for addr in active_addresses
-            ]) if active_addresses else "",
-        })
+    # ✅ One query: each user with their active address(es) only, by id
+    delivery_location = func.string_agg(
+        func.concat_ws(", ", Address.house_number, Address.street, Address.barangay, Address.city, Address.province),
+        ", ",
+    ).label("delivery_location")
+    query = (
+        db.query(User.id, User.email, User.status, delivery_location)
+        .outerjoin(Address, (Address.user_id == User.id) & Address.is_active.is_(True))
+        .group_by(User.id)
+    )
+    if search:
+        query = query.filter(func.lower(User.email).like(tools.like_prefix(search)))
+    if status:
+        query = query.filter(User.status == UserStatus(status.lower()))
+
+    try:
+        users, next_cursor = tools.keyset_page(query, [User.id], cursor, limit, descending=False)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
 
-    return {"users": result}
+    return {
+        "users": [
+            {
+                "id": user.id,
+                "email": user.email,
+                "status": "Banned" if user.status == UserStatus.Banned else "Active",
+                "deliveryLocation": user.delivery_location or "",
+            }
+            for user in users
+        ]
+    }
 
 @router.post("/users/{user_id}/ban")
 def ban_user(user_id: int, admin_email: str | None = Cookie(default=None), db: Session = Depends(get_db)):
@@ -110,34 +148,74 @@ def ban_user(user_id: int, admin_email: str | None = Cookie(default=None), db: S
 
 
 
+ORDER_SORT_COLUMNS = {
+    "created_at": TableOrders.created_at,
+    "customer": TableOrders.user_email,
+}
+
+
 @router.get("/orders/all")
-def get_all_orders(db: Session = Depends(get_db)):
-    orders = db.query(TableOrders).all()
-    result = []
-
-    for order in orders:
-        order_item = db.query(OrderItem).filter(OrderItem.order_id == order.id).first()
-        if order_item:
-            result.append({
-                "order_id": order.id,
-                "product_id": order_item.product_id,
-                "customer_email": order.user_email,
-                "tile_name": order_item.tile_name,
-                "tile_price": order_item.tile_price,
-                "quantity": order_item.quantity,
-                "created_at": order.created_at,
-                "status": order.status,
-                "estimated_delivery": order.estimated_delivery,
-            })
-    return result
+def get_all_orders(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    status: OrderStatus | None = None,
+    customer: str | None = None,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    sort: str = Query("created_at", pattern="^(created_at|customer)$"),
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    db: Session = Depends(get_db),
+):
+    # ✅ Filters run in SQL; items of the page come in one extra IN query
+    query = db.query(TableOrders).options(selectinload(TableOrders.items))
+    if status:
+        query = query.filter(TableOrders.status == status)
+    if customer:
+        query = query.filter(func.lower(TableOrders.user_email).like(tools.like_prefix(customer)))
+    query = query.filter(*tools.date_range(TableOrders.created_at, start_date, end_date))
+
+    try:
+        orders, next_cursor = tools.keyset_page(
+            query, [ORDER_SORT_COLUMNS[sort], TableOrders.id], cursor, limit, descending=order == "desc"
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+
+    return [
+        {
+            "order_id": o.id,
+            "customer_email": o.user_email,
+            "created_at": o.created_at,
+            "status": o.status,
+            "estimated_delivery": o.estimated_delivery,
+            "total": sum(item.tile_price * item.quantity for item in o.items),
+            "items": [
+                {
+                    "product_id": item.product_id,
+                    "tile_name": item.tile_name,
+                    "tile_price": item.tile_price,
+                    "quantity": item.quantity,
+                }
+                for item in o.items
+            ],
+        }
+        for o in orders
+    ]
 
 @router.put("/orders/update/{order_id}", response_model=OrderAdminResponse)
 def admin_update_order(order_id: int, update_data: OrderAdminUpdate, db: Session = Depends(get_db)):
-    # ✅ Find the order
-    order = db.query(TableOrders).filter(TableOrders.id == order_id).first()
+    # ✅ Find the order (locked so the reservation sweeper cannot reject it meanwhile)
+    order = db.query(TableOrders).filter(TableOrders.id == order_id).with_for_update().first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
+    # ✅ Shipped and rejected orders no longer hold stock, so they are final
+    if order.status in (OrderStatus.Shipped, OrderStatus.Rejected):
+        raise HTTPException(status_code=400, detail=f"Order is already {order.status.value}")
+
     # ✅ Handle status updates
     if update_data.status == OrderStatus.Approved.value:
         if not update_data.estimated_delivery:
@@ -147,47 +225,46 @@ def admin_update_order(order_id: int, update_data: OrderAdminUpdate, db: Session
             )
         order.status = OrderStatus.Approved.value
         order.estimated_delivery = update_data.estimated_delivery
+        StockReservations.keep_until_shipped(db, [order.id])
 
     elif update_data.status == OrderStatus.Shipped.value:
         order.status = OrderStatus.Shipped.value
+        sales = []
+        ledger = []
+        held = StockReservations.held_quantities(db, [order.id])
+
+        # ✅ Lock every product of the order in id order, like bulk shipping and checkout
+        product_ids = sorted({item.product_id for item in order.items})
+        products = {
+            p.id: p for p in db.query(Products).filter(Products.id.in_(product_ids)).order_by(Products.id).with_for_update().all()
+        }
 
         # ✅ For each item in the order, check and update stock
         for item in order.items:
-            product = db.query(Products).filter(Products.id == item.product_id).first()
+            product = products.get(item.product_id)
             if not product:
                 raise HTTPException(status_code=404, detail=f"Product with ID {item.product_id} not found")
 
-            # ✅ Check stock availability
-            if product.tile_stock < item.quantity:
+            # ✅ Turn this order's reservation into a stock decrement. Orders placed
+            # before reservations existed hold nothing and need free stock instead.
+            from_reservation = min(held.get(item.product_id, 0), item.quantity)
+            held[item.product_id] = held.get(item.product_id, 0) - from_reservation
+            available = product.tile_stock - product.reserved + from_reservation
+            if available < item.quantity:
                 raise HTTPException(
                     status_code=400,
-                    detail=f"Not enough stock for product '{product.tile_name}'. Available: {product.tile_stock}, Required: {item.quantity}"
+                    detail=f"Not enough stock for product '{product.tile_name}'. Available: {available}, Required: {item.quantity}"
                 )
 
             # ✅ Reduce stock
+            facets_before = facet_keys(product)
+            previous_stock = product.tile_stock
             product.tile_stock -= item.quantity
-
-            # ✅ Log the shipped item
-            log = OrderLog(
-                order_id=order.id,
-                user_email=order.user_email,
-                created_at=order.created_at,
-                status=order.status,
-                estimated_delivery=order.estimated_delivery,
-                house_number=order.house_number,
-                street=order.street,
-                barangay=order.barangay,
-                city=order.city,
-                province=order.province,
-                product_id=item.product_id,
-                tile_name=item.tile_name,
-                tile_category=item.tile_category,
-                tile_type=item.tile_type,
-                tile_image=item.tile_image,
-                tile_price=item.tile_price,
-                quantity=item.quantity
-            )
-            db.add(log)
+            product.reserved -= from_reservation
+            apply_facet_delta(db, facet_delta(facets_before, facet_keys(product)))
+            ledger.append(StockLedger.stock_entry(product.id, "ship", previous_stock, product.tile_stock))
+            if from_reservation:
+                ledger.append(StockLedger.reserved_entry(product.id, "release", from_reservation, product.tile_stock))
 
             # ✅ Record sale
             sale = Sales(
@@ -200,37 +277,27 @@ def admin_update_order(order_id: int, update_data: OrderAdminUpdate, db: Session
                 total_price=item.tile_price * item.quantity
             )
             db.add(sale)
+            sales.append(sale)
+
+        # ✅ Keep the per-product sold counters and the stock ledger in the same transaction
+        record_sales(db, sales)
+        StockLedger.log_entries(db, ledger)
+        OrderLogs.insert_order_logs(db, [order.id])
+        StockReservations.drop(db, [order.id])
 
     elif update_data.status == OrderStatus.Rejected.value:
         order.status = OrderStatus.Rejected.value
+        StockReservations.release(db, [order.id])
         # ✅ Log rejection
-        for item in order.items:
-            log = OrderLog(
-                order_id=order.id,
-                user_email=order.user_email,
-                created_at=order.created_at,
-                status=order.status,
-                estimated_delivery=order.estimated_delivery,
-                house_number=order.house_number,
-                street=order.street,
-                barangay=order.barangay,
-                city=order.city,
-                province=order.province,
-                product_id=item.product_id,
-                tile_name=item.tile_name,
-                tile_category=item.tile_category,
-                tile_type=item.tile_type,
-                tile_image=item.tile_image,
-                tile_price=item.tile_price,
-                quantity=item.quantity
-            )
-            db.add(log)
+        OrderLogs.insert_order_logs(db, [order.id])
 
     else:
         raise HTTPException(status_code=400, detail="Invalid order status")
 
     # ✅ Commit all database changes
     db.commit()
+    if update_data.status == OrderStatus.Shipped.value:
+        catalog_cache.invalidate()
     db.refresh(order)
 
     # ✅ Return updated order details
@@ -248,34 +315,178 @@ def admin_update_order(order_id: int, update_data: OrderAdminUpdate, db: Session
     )
 
 
+def ship_orders(db: Session, order_ids: list[int]) -> dict[int, str]:
+    """
+    Ship the orders with set-based statements. Returns the orders that could
+    not be shipped with the reason; everything else is shipped.
+    """
+    items_by_order = defaultdict(list)
+    for item in (
+        db.query(OrderItem.order_id, OrderItem.product_id, OrderItem.quantity)
+        .filter(OrderItem.order_id.in_(order_ids))
+        .order_by(OrderItem.order_id)
+        .all()
+    ):
+        items_by_order[item.order_id].append(item)
+    held = defaultdict(int)
+    for reservation in (
+        db.query(StockReservation)
+        .filter(StockReservation.order_id.in_(order_ids))
+        .all()
+    ):
+        held[(reservation.order_id, reservation.product_id)] += reservation.quantity
+
+    # Lock every product involved, in id order, and work out which orders the stock covers
+    product_ids = sorted({item.product_id for order_items in items_by_order.values() for item in order_items})
+    products = {
+        p.id: p for p in db.query(Products).filter(Products.id.in_(product_ids)).order_by(Products.id).with_for_update().all()
+    }
+    free = {pid: p.tile_stock - p.reserved for pid, p in products.items()}
+
+    failed = {}
+    shipped_ids = []
+    stock_used = Counter()
+    reservation_used = Counter()
+    for order_id in order_ids:
+        order_items = items_by_order[order_id]
+        need_free = Counter()
+        use_held = Counter()
+        for item in order_items:
+            if item.product_id not in products:
+                failed[order_id] = f"Product with ID {item.product_id} not found"
+                break
+            from_reservation = min(held[(order_id, item.product_id)] - use_held[item.product_id], item.quantity)
+            use_held[item.product_id] += from_reservation
+            need_free[item.product_id] += item.quantity - from_reservation
+        else:
+            short = [pid for pid, qty in need_free.items() if free[pid] < qty]
+            if short:
+                failed[order_id] = f"Not enough stock for product '{products[short[0]].tile_name}'"
+            else:
+                for pid, qty in need_free.items():
+                    free[pid] -= qty
+                for item in order_items:
+                    stock_used[item.product_id] += item.quantity
+                reservation_used.update(use_held)
+                shipped_ids.append(order_id)
+
+    if not shipped_ids:
+        return failed
+
+    # ✅ Facet counts from the before/after stock of each product
+    delta = Counter()
+    ledger = []
+    for pid, qty in sorted(stock_used.items()):
+        product = products[pid]
+        before = facet_keys(product)
+        previous_stock = product.tile_stock
+        product.tile_stock -= qty
+        product.reserved -= reservation_used[pid]
+        delta.update(facet_delta(before, facet_keys(product)))
+        ledger.append(StockLedger.stock_entry(pid, "ship", previous_stock, product.tile_stock))
+        if reservation_used[pid]:
+            ledger.append(StockLedger.reserved_entry(pid, "release", reservation_used[pid], product.tile_stock))
+    db.flush()
+    apply_facet_delta(db, delta)
+    StockLedger.log_entries(db, ledger)
+
+    db.query(TableOrders).filter(TableOrders.id.in_(shipped_ids)).update(
+        {TableOrders.status: OrderStatus.Shipped}, synchronize_session=False
+    )
+    OrderLogs.insert_order_logs(db, shipped_ids)
+
+    # ✅ Sales rows straight from the order items, then the sold counters from what was inserted
+    sales = db.execute(
+        insert(Sales).from_select(
+            ["order_id", "product_id", "customer_email", "tile_name", "tile_price", "quantity", "total_price", "created_at"],
+            select(
+                OrderItem.order_id, OrderItem.product_id, TableOrders.user_email, OrderItem.tile_name,
+                OrderItem.tile_price, OrderItem.quantity, OrderItem.tile_price * OrderItem.quantity,
+                literal(datetime.now(tools.PH_TZ)),
+            )
+            .join(TableOrders, TableOrders.id == OrderItem.order_id)
+            .where(OrderItem.order_id.in_(shipped_ids))
+        ).returning(Sales.product_id, Sales.tile_name, Sales.quantity, Sales.total_price, Sales.created_at)
+    ).all()
+    record_sales(db, sales)
+    StockReservations.drop(db, shipped_ids)
+
+    return failed
+
+
+@router.put("/orders/bulk-update")
+def admin_bulk_update_orders(data: BulkOrderAdminUpdate, db: Session = Depends(get_db)):
+    """
+    Move many orders to Approved, Shipped or Rejected in one transaction.
+    Orders that cannot make the transition are reported and left unchanged;
+    the rest are updated together.
+    """
+    if data.status not in (OrderStatus.Approved.value, OrderStatus.Shipped.value, OrderStatus.Rejected.value):
+        raise HTTPException(status_code=400, detail="Invalid order status")
+    if data.status == OrderStatus.Approved.value and not data.estimated_delivery:
+        raise HTTPException(status_code=400, detail="Estimated delivery is required when approving an order")
+
+    order_ids = sorted(set(data.order_ids))
+    orders = dict(
+        db.query(TableOrders.id, TableOrders.status)
+        .filter(TableOrders.id.in_(order_ids))
+        .order_by(TableOrders.id)
+        .with_for_update()
+        .all()
+    )
+
+    failed = {}
+    for order_id in order_ids:
+        if order_id not in orders:
+            failed[order_id] = "Order not found"
+        elif orders[order_id] in (OrderStatus.Shipped, OrderStatus.Rejected):
+            failed[order_id] = f"Order is already {orders[order_id].value}"
+    eligible = [order_id for order_id in order_ids if order_id not in failed]
+
+    if eligible and data.status == OrderStatus.Approved.value:
+        db.query(TableOrders).filter(TableOrders.id.in_(eligible)).update(
+            {TableOrders.status: OrderStatus.Approved, TableOrders.estimated_delivery: data.estimated_delivery},
+            synchronize_session=False,
+        )
+        StockReservations.keep_until_shipped(db, eligible)
+
+    elif eligible and data.status == OrderStatus.Rejected.value:
+        StockReservations.release(db, eligible)
+        db.query(TableOrders).filter(TableOrders.id.in_(eligible)).update(
+            {TableOrders.status: OrderStatus.Rejected}, synchronize_session=False
+        )
+        OrderLogs.insert_order_logs(db, eligible)
+
+    elif eligible and data.status == OrderStatus.Shipped.value:
+        failed.update(ship_orders(db, eligible))
+
+    db.commit()
+    if data.status == OrderStatus.Shipped.value and len(failed) < len(order_ids):
+        catalog_cache.invalidate()
+
+    return {
+        "updated": len(order_ids) - len(failed),
+        "failed": len(failed),
+        "results": [
+            {"order_id": order_id, "status": "failed", "detail": failed[order_id]}
+            if order_id in failed else
+            {"order_id": order_id, "status": data.status}
+            for order_id in order_ids
+        ],
+    }
+
+
 @router.delete("/orders/delete/{order_id}")
 def admin_delete_order(order_id: int, db: Session = Depends(get_db)):
-    order = db.query(TableOrders).filter(TableOrders.id == order_id).first()
+    order = db.query(TableOrders).filter(TableOrders.id == order_id).with_for_update().first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
 
-    # ✅ Log all order items before deleting
-    for item in order.items:
-        log = OrderLog(
-            order_id=order.id,
-            user_email=order.user_email,
-            created_at=order.created_at,
-            status=OrderStatus.Rejected, 
-            estimated_delivery=order.estimated_delivery,
-            house_number=order.house_number,
-            street=order.street,
-            barangay=order.barangay,
-            city=order.city,
-            province=order.province,
-            product_id=item.product_id,
-            tile_name=item.tile_name,
-            tile_category=item.tile_category,
-            tile_type=item.tile_type,
-            tile_image=item.tile_image,
-            tile_price=item.tile_price,
-            quantity=item.quantity
-        )
-        db.add(log)
+    StockReservations.release(db, [order.id])
+
+    # ✅ Log all order items as rejected before deleting
+    order.status = OrderStatus.Rejected
+    OrderLogs.insert_order_logs(db, [order.id])
 
     # Delete order items first
     db.query(OrderItem).filter(OrderItem.order_id == order_id).delete()
@@ -307,14 +518,81 @@ def get_order_logs(db: Session = Depends(get_db)):
 
     return {"order_logs": response}
 
+# =========================
+# 📤 Exports (streamed, for accounting)
+# =========================
+ORDER_LOG_EXPORT_COLUMNS = [
+    "id", "order_id", "user_email", "status", "created_at", "estimated_delivery",
+    "product_id", "tile_name", "tile_category", "tile_type", "tile_price", "quantity",
+    "house_number", "street", "barangay", "city", "province",
+]
+SALES_EXPORT_COLUMNS = [
+    "id", "order_id", "product_id", "customer_email", "tile_name", "tile_price", "quantity", "total_price", "created_at",
+]
+STOCK_RECORD_EXPORT_COLUMNS = [
+    "id", "product_id", "change_type", "quantity_changed", "previous_stock", "new_stock", "created_at",
+]
+
+
+@router.get("/export/order-logs")
+def export_order_logs(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    start_date: date | None = None,
+    end_date: date | None = None,
+):
+    return Exports.export_response(
+        lambda db: db.query(*[getattr(OrderLog, c) for c in ORDER_LOG_EXPORT_COLUMNS])
+        .filter(*tools.date_range(OrderLog.created_at, start_date, end_date))
+        .order_by(OrderLog.id),
+        ORDER_LOG_EXPORT_COLUMNS, "order_logs", format, gzip,
+    )
+
+
+@router.get("/export/sales")
+def export_sales(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    start_date: date | None = None,
+    end_date: date | None = None,
+):
+    return Exports.export_response(
+        lambda db: db.query(*[getattr(Sales, c) for c in SALES_EXPORT_COLUMNS])
+        .filter(*tools.date_range(Sales.created_at, start_date, end_date))
+        .order_by(Sales.id),
+        SALES_EXPORT_COLUMNS, "sales", format, gzip,
+    )
+
+
+@router.get("/export/stock-records")
+def export_stock_records(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+    start_date: date | None = None,
+    end_date: date | None = None,
+):
+    return Exports.export_response(
+        lambda db: db.query(
+            *[getattr(StockRecord, c) for c in STOCK_RECORD_EXPORT_COLUMNS],
+            Products.tile_name, Products.tile_category, Products.tile_type,
+        )
+        .join(Products, StockRecord.product_id == Products.id)
+        .filter(*tools.date_range(StockRecord.created_at, start_date, end_date))
+        .order_by(StockRecord.id),
+        STOCK_RECORD_EXPORT_COLUMNS + ["tile_name", "tile_category", "tile_type"], "stock_records", format, gzip,
+    )
+
+
 @router.put("/product/{product_id}/update-stock")
 def update_product_stock(product_id: int, data: ProductStockUpdate, db: Session = Depends(get_db)):
-    product = db.query(Products).filter(Products.id == product_id).first()
+    product = db.query(Products).filter(Products.id == product_id).with_for_update().first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
     previous_stock = product.tile_stock
+    facets_before = facet_keys(product)
     product.tile_stock = data.tile_stock
+    apply_facet_delta(db, facet_delta(facets_before, facet_keys(product)))
 
     # Create stock record
     record = StockRecord(
@@ -327,6 +605,7 @@ def update_product_stock(product_id: int, data: ProductStockUpdate, db: Session
 
     db.add(record)
     db.commit()
+    catalog_cache.invalidate()
     db.refresh(product)
 
     return {
@@ -339,12 +618,14 @@ def update_product_stock(product_id: int, data: ProductStockUpdate, db: Session
 
 @router.put("/product/{product_id}/add-stock")
 def add_product_stock(product_id: int, data: ProductStockUpdate, db: Session = Depends(get_db)):
-    product = db.query(Products).filter(Products.id == product_id).first()
+    product = db.query(Products).filter(Products.id == product_id).with_for_update().first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
     previous_stock = product.tile_stock
+    facets_before = facet_keys(product)
     product.tile_stock += data.tile_stock
+    apply_facet_delta(db, facet_delta(facets_before, facet_keys(product)))
 
     # Create stock record
     record = StockRecord(
@@ -357,6 +638,7 @@ def add_product_stock(product_id: int, data: ProductStockUpdate, db: Session = D
 
     db.add(record)
     db.commit()
+    catalog_cache.invalidate()
     db.refresh(product)
 
     return {
@@ -367,38 +649,74 @@ def add_product_stock(product_id: int, data: ProductStockUpdate, db: Session = D
     }
 
 @router.get("/product/stock-records")
-def get_all_stock_records(db: Session = Depends(get_db)):
-    # Fetch all stock records, newest first
-    records = (
-        db.query(StockRecord)
+def get_all_stock_records(
+    response: Response,
+    limit: int = Query(100, ge=1, le=500),
+    cursor: str | None = None,
+    product_id: int | None = None,
+    change_type: str | None = None,
+    start_date: date | None = None,
+    end_date: date | None = None,
+    db: Session = Depends(get_db),
+):
+    # ✅ One joined query for the needed columns, newest first, keyset paginated
+    query = (
+        db.query(
+            StockRecord.id,
+            StockRecord.product_id,
+            Products.tile_name,
+            Products.tile_category,
+            Products.tile_type,
+            StockRecord.change_type,
+            StockRecord.quantity_changed,
+            StockRecord.previous_stock,
+            StockRecord.new_stock,
+            StockRecord.created_at,
+        )
         .join(Products, StockRecord.product_id == Products.id)
-        .order_by(StockRecord.created_at.desc())
-        .all()
+        .filter(*tools.date_range(StockRecord.created_at, start_date, end_date))
     )
+    if product_id is not None:
+        query = query.filter(StockRecord.product_id == product_id)
+    if change_type:
+        query = query.filter(StockRecord.change_type == change_type)
+
+    try:
+        records, next_cursor = tools.keyset_page(query, [StockRecord.created_at, StockRecord.id], cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
 
     # If no records found
-    if not records:
+    if not records and not cursor:
         return {"message": "No stock records found", "records": []}
 
-    # Format the response
-    return {
-        "total_records": len(records),
-        "records": [
-            {
-                "id": r.id,
-                "product_id": r.product_id,
-                "tile_name": r.product.tile_name if r.product else None,
-                "tile_category": r.product.tile_category if r.product else None,
-                "tile_type": r.product.tile_type if r.product else None,
-                "change_type": r.change_type,
-                "quantity_changed": r.quantity_changed,
-                "previous_stock": r.previous_stock,
-                "new_stock": r.new_stock,
-                "created_at": r.created_at,
-            }
-            for r in records
-        ],
-    }
+    return {"records": [dict(r._mapping) for r in records]}
+
+@router.get("/inventory/as-of")
+def get_inventory_as_of(
+    at: datetime,
+    product_id: int | None = None,
+    db: Session = Depends(get_db),
+):
+    # Times without an offset are PH time, like everywhere else in the admin
+    if at.tzinfo is None:
+        at = at.replace(tzinfo=tools.PH_TZ)
+
+    inventory = StockLedger.stock_as_of(db, at, product_id)
+    if inventory is None:
+        raise HTTPException(status_code=404, detail="No inventory snapshot exists before this time")
+    return inventory
+
+@router.get("/inventory/forecast")
+def get_inventory_forecast(
+    method: str = Query("ewma", pattern="^(ewma|sma)$"),
+    lead_time_days: int = Query(Forecasting.LEAD_TIME_DAYS, ge=1, le=180),
+    low_only: bool = False,
+    db: Session = Depends(get_db),
+):
+    return Forecasting.forecast_inventory(db, method, lead_time_days, low_only)
 
 @router.get("/dashboard/stats")
 def get_dashboard_stats(db: Session = Depends(get_db)):
@@ -406,41 +724,23 @@ def get_dashboard_stats(db: Session = Depends(get_db)):
     Return today's sales, orders, items sold, total sales, and low stock.
     Used for dashboard only.
     """
-    today = date.today()
-    tomorrow = today + timedelta(days=1)
-
-    # Sales today
-    total_sales_today = (
-        db.query(func.sum(Sales.total_price))
-        .filter(Sales.created_at >= today)
-        .filter(Sales.created_at < tomorrow)
-        .scalar()
-        or 0
-    )
+    today = ph_today()
+
+    # Sales and items today
+    total_items_today, total_sales_today = range_totals(db, today, today)
 
     # Orders today
     total_orders_today = (
-        db.query(TableOrders)
-        .filter(TableOrders.created_at >= today)
-        .filter(TableOrders.created_at < tomorrow)
-        .count()
-    )
-
-    # Items sold today
-    total_items_today = (
-        db.query(func.sum(Sales.quantity))
-        .filter(Sales.created_at >= today)
-        .filter(Sales.created_at < tomorrow)
+        db.query(func.count(TableOrders.id))
+        .filter(*tools.date_range(TableOrders.created_at, today, today))
         .scalar()
-        or 0
     )
 
-    # Low stock count
-    from database.ProductTable import Products
-    low_stock_count = db.query(Products).filter(Products.tile_stock < 10).count()
+    # Low stock count (per-product reorder points from the demand forecast)
+    low_stock_count = Forecasting.low_stock_count(db)
 
-    # Total sales overall
-    total_sales_overall = db.query(func.sum(Sales.total_price)).scalar() or 0
+    # Total sales overall (rollup for past days + today's raw rows)
+    _, total_sales_overall = range_totals(db, None, None)
 
     return {
         "total_sales_today": total_sales_today,
@@ -453,22 +753,31 @@ def get_dashboard_stats(db: Session = Depends(get_db)):
 # Weekly sales performance for chart
 @router.get("/sales/performance")
 def get_sales_performance(db: Session = Depends(get_db)):
-    today = date.today()
+    today = ph_today()
     dates = [today - timedelta(days=i) for i in reversed(range(7))]
 
-    sales_data = []
-    for d in dates:
-        next_day = d + timedelta(days=1)
-        daily_total = db.query(func.sum(Sales.total_price))\
-            .filter(Sales.created_at >= d)\
-            .filter(Sales.created_at < next_day)\
-            .scalar() or 0
-        sales_data.append(daily_total)
+    sales_data = sales_series(db, dates[0], today, "day")["series"][0]["revenue"]
 
     categories = [d.strftime("%a") for d in dates]  # Mon, Tue, etc.
     return {"categories": categories, "data": sales_data}
 
 
+@router.get("/sales/series")
+def get_sales_series(
+    start_date: date,
+    end_date: date,
+    granularity: str = Query("day", pattern="^(hour|day|week|month)$"),
+    group_by: str | None = Query(None, pattern="^(product|category)$"),
+    db: Session = Depends(get_db),
+):
+    if start_date > end_date:
+        raise HTTPException(status_code=400, detail="Start date cannot be after end date")
+    if granularity == "hour" and (end_date - start_date).days >= MAX_HOURLY_DAYS:
+        raise HTTPException(status_code=400, detail=f"Hourly series are limited to {MAX_HOURLY_DAYS} days")
+
+    return sales_series(db, start_date, end_date, granularity, group_by)
+
+
 @router.get("/customer_recent_activity", response_model=list[dict])
 def get_recent_activities(admin_email: str = Cookie(None), db: Session = Depends(get_db)):
     if not admin_email:
@@ -484,11 +793,27 @@ def get_recent_activities(admin_email: str = Cookie(None), db: Session = Depends
     )
 
     return [
-        {"activity": f"• {act.email} {act.activity} {act.created_at.strftime('%Y-%m-%d %H:%M:%S')}"}
+        {"activity": ActivityFeed.describe(ActivityFeed.to_entry(act))}
         for act in activities
     ]
 
 
+@router.get("/customer_recent_activity/stream")
+def stream_recent_activities(
+    request: Request,
+    last_event_id: str | None = Header(default=None),
+    admin_email: str = Cookie(None),
+):
+    if not admin_email:
+        raise HTTPException(status_code=401, detail="Unauthorized access — Admin not found")
+
+    return StreamingResponse(
+        ActivityFeed.stream(request, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @router.get("/sales/report")
 def generate_sales_report(
     start_date: date,
@@ -507,59 +832,10 @@ def generate_sales_report(
     if start_date > end_date:
         raise HTTPException(status_code=400, detail="Start date cannot be after end date")
 
-    # 📊 Total sales in range
-    total_sales = (
-        db.query(func.sum(Sales.total_price))
-        .filter(Sales.created_at >= start_date)
-        .filter(Sales.created_at < end_date + timedelta(days=1))
-        .scalar()
-        or 0
-    )
-
-    # 🧾 Total orders in range
-    total_orders = (
-        db.query(TableOrders)
-        .filter(TableOrders.created_at >= start_date)
-        .filter(TableOrders.created_at < end_date + timedelta(days=1))
-        .count()
-    )
+    # ✅ Served from the report cache; finished ranges are computed only once
+    return get_sales_report(db, start_date, end_date)
 
-    # 📦 Total items sold in range
-    total_items = (
-        db.query(func.sum(Sales.quantity))
-        .filter(Sales.created_at >= start_date)
-        .filter(Sales.created_at < end_date + timedelta(days=1))
-        .scalar()
-        or 0
-    )
 
-    # 🏆 Best-selling products with total revenue
-    best_sellers = (
-        db.query(
-            Sales.tile_name,
-            func.sum(Sales.quantity).label("total_sold"),
-            func.sum(Sales.total_price).label("total_revenue")
-        )
-        .filter(Sales.created_at >= start_date)
-        .filter(Sales.created_at < end_date + timedelta(days=1))
-        .group_by(Sales.tile_name)
-        .order_by(func.sum(Sales.quantity).desc())
-        .limit(5)
-        .all()
-    )
-
-    return {
-        "start_date": start_date,
-        "end_date": end_date,
-        "total_sales": total_sales,
-        "total_orders": total_orders,
-        "total_items": total_items,
-        "best_sellers": [
-            {
-                "tile_name": name,
-                "total_sold": sold,
-                "total_revenue": revenue or 0
-            }
-            for name, sold, revenue in best_sellers
-        ],
-    }
+@router.get("/sales/report/cache-stats")
+def get_sales_report_cache_stats():
+    return report_cache.stats()
@@ -1,72 +1,138 @@
 from fastapi import APIRouter, Depends, HTTPException, Cookie
 from sqlalchemy.orm import Session
-from database.ProductTable import Carts as CartModel
-from models.ProductModel import AddCartItem, CartItemResponse
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from database.ProductTable import Carts as CartModel, Products
+from models.ProductModel import AddCartItem, CartItemResponse, CartResponse, CartBulkUpdate
 from DatabaseConnector import get_db
 
 router = APIRouter(prefix="/cart", tags=["Cart"])
 
 
+def query_cart_lines(db: Session, user_email: str, product_id: int | None = None):
+    """
+    Cart lines joined with the product columns they display, plus cart-wide
+    totals computed as window functions, all in one query. Every row carries
+    the same subtotal / item_count / shortfall values.
+    """
+    line_total = Products.tile_price * CartModel.quantity
+    short = CartModel.quantity > func.coalesce(Products.tile_stock, 0) - Products.reserved
+
+    query = (
+        db.query(
+            CartModel.product_id,
+            CartModel.quantity,
+            Products.tile_image,
+            Products.tile_category,
+            Products.tile_type,
+            Products.tile_name,
+            Products.tile_price,
+            Products.tile_stock,
+            line_total.label("line_total"),
+            short.label("stock_shortfall"),
+            func.sum(line_total).over().label("subtotal"),
+            func.sum(CartModel.quantity).over().label("item_count"),
+            func.bool_or(short).over().label("has_stock_shortfall"),
+        )
+        .join(Products, Products.id == CartModel.product_id)
+        .filter(CartModel.user_email == user_email)
+        .order_by(CartModel.id)
+    )
+    if product_id is not None:
+        query = query.filter(CartModel.product_id == product_id)
+    return query.all()
+
+
+def to_cart_item(row) -> CartItemResponse:
+    return CartItemResponse(
+        product_id=row.product_id,
+        tile_image=row.tile_image or "",
+        tile_category=row.tile_category or "",
+        tile_type=row.tile_type or "",
+        tile_name=row.tile_name,
+        tile_price=row.tile_price,
+        tile_stock=row.tile_stock or 0,
+        quantity=row.quantity,
+        line_total=row.line_total,
+        stock_shortfall=row.stock_shortfall,
+    )
+
+
+def build_cart_response(db: Session, user_email: str) -> CartResponse:
+    rows = query_cart_lines(db, user_email)
+    return CartResponse(
+        items=[to_cart_item(row) for row in rows],
+        subtotal=rows[0].subtotal if rows else 0,
+        item_count=rows[0].item_count if rows else 0,
+        has_stock_shortfall=rows[0].has_stock_shortfall if rows else False,
+    )
+
+
 # ---------------- GET CART ITEMS ----------------
-@router.get("/", response_model=list[CartItemResponse])
+@router.get("/", response_model=CartResponse)
 def get_cart_items(user_email: str = Cookie(None), db: Session = Depends(get_db)):
     if not user_email:
         raise HTTPException(status_code=401, detail="User not authenticated")
 
-    cart_items = db.query(CartModel).filter(CartModel.user_email == user_email).all()
-
-    return [
-        CartItemResponse(
-            product_id=item.product_id,
-            tile_image=item.product.tile_image or "",
-            tile_category=item.product.tile_category or "",
-            tile_type=item.product.tile_type or "",
-            tile_name=item.product.tile_name,
-            tile_price=item.product.tile_price,
-            tile_stock=item.product.tile_stock,
-            quantity=item.quantity
-        )
-        for item in cart_items
-    ]
+    return build_cart_response(db, user_email)
 
 @router.post("/add", response_model=CartItemResponse)
 def add_to_cart(item: AddCartItem, user_email: str = Cookie(None), db: Session = Depends(get_db)):
     if not user_email:
         raise HTTPException(status_code=401, detail="User not authenticated")
 
-    # Use filter instead of filter_by for clarity
-    existing_item = db.query(CartModel).filter(
-        CartModel.user_email == user_email,
-        CartModel.product_id == item.product_id
-    ).first()
+    # Insert the line, or increment its quantity if it is already in the cart.
+    # Atomic against concurrent adds thanks to the unique (user_email, product_id) index.
+    stmt = insert(CartModel).values(
+        user_email=user_email,
+        product_id=item.product_id,
+        quantity=item.quantity
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[CartModel.user_email, CartModel.product_id],
+        set_={"quantity": CartModel.quantity + stmt.excluded.quantity},
+    ))
+    db.commit()
 
-    if existing_item:
-        # Increment quantity if already in cart
-        existing_item.quantity += item.quantity
-        db.commit()
-        db.refresh(existing_item)
-        cart_item = existing_item
-    else:
-        # Add new item to cart
-        cart_item = CartModel(
-            user_email=user_email,
-            product_id=item.product_id,
-            quantity=item.quantity
-        )
-        db.add(cart_item)
-        db.commit()
-        db.refresh(cart_item)
+    rows = query_cart_lines(db, user_email, item.product_id)
+    if not rows:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return to_cart_item(rows[0])
+
+# ---------------- BULK UPDATE CART ----------------
+@router.post("/bulk", response_model=CartResponse)
+def bulk_update_cart(changes: CartBulkUpdate, user_email: str = Cookie(None), db: Session = Depends(get_db)):
+    """
+    Apply several cart edits in one transaction: optionally clear the cart,
+    remove the listed products, then set the given quantities.
+    """
+    if not user_email:
+        raise HTTPException(status_code=401, detail="User not authenticated")
+
+    # Last quantity wins if a product is listed twice
+    quantities = {item.product_id: item.quantity for item in changes.items}
+    remove = set(changes.remove) | {product_id for product_id, qty in quantities.items() if qty <= 0}
+    upserts = [
+        {"user_email": user_email, "product_id": product_id, "quantity": qty}
+        for product_id, qty in sorted(quantities.items()) if product_id not in remove
+    ]
+
+    cart = db.query(CartModel).filter(CartModel.user_email == user_email)
+    if changes.clear:
+        cart.delete(synchronize_session=False)
+    elif remove:
+        cart.filter(CartModel.product_id.in_(remove)).delete(synchronize_session=False)
+
+    if upserts:
+        stmt = insert(CartModel).values(upserts)
+        db.execute(stmt.on_conflict_do_update(
+            index_elements=[CartModel.user_email, CartModel.product_id],
+            set_={"quantity": stmt.excluded.quantity},
+        ))
+
+    db.commit()
+    return build_cart_response(db, user_email)
 
-    return CartItemResponse(
-        product_id=cart_item.product_id,
-        tile_image=cart_item.product.tile_image or "",
-        tile_category=cart_item.product.tile_category or "",
-        tile_type=cart_item.product.tile_type or "",
-        tile_name=cart_item.product.tile_name,
-        tile_price=cart_item.product.tile_price,
-        tile_stock=cart_item.product.tile_stock,
-        quantity=cart_item.quantity
-    )
 
 # ---------------- DELETE FROM CART ----------------
 @router.delete("/delete/{product_id}", response_model=dict)
@@ -0,0 +1,43 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException, Header, Response
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+from DatabaseConnector import get_db
+import MediaStore
+import tools
+
+router = APIRouter(prefix="/media", tags=["media"])
+
+# Files are content addressed, so a given URL never changes
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/{media_hash}")
+def get_media(
+    media_hash: str,
+    if_none_match: str | None = Header(default=None),
+    db: Session = Depends(get_db)
+):
+    if not MediaStore.is_media_hash(media_hash):
+        raise HTTPException(status_code=404, detail="Media not found")
+
+    etag = f'"{media_hash}"'
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "X-Content-Type-Options": "nosniff"}
+
+    if tools.etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    content_type = MediaStore.get_content_type(db, media_hash)
+    path = MediaStore.media_path(media_hash)
+    if not content_type or not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Media not found")
+
+    # Files stored before uploads were restricted to raster images are only
+    # offered as downloads, never rendered from this origin
+    if content_type in MediaStore.IMAGE_TYPES:
+        headers["Content-Disposition"] = "inline"
+    else:
+        content_type = "application/octet-stream"
+        headers["Content-Disposition"] = "attachment"
+
+    return FileResponse(path, media_type=content_type, headers=headers)
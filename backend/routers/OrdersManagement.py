@@ -1,12 +1,15 @@
 from DatabaseConnector import get_db
-from sqlalchemy.orm import Session
-from fastapi import APIRouter, Depends, HTTPException, Cookie
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy import and_, insert
+from fastapi import APIRouter, Depends, HTTPException, Cookie, Query, Response, Header
 
-from models.ProductModel import Orders as OrdersModel, OrderResponse,DeliveryAddress
-from database.ProductTable import Orders as TableOrders, OrderItem, OrderStatus, Products,OrderLog as TableOrderLog
+from models.ProductModel import Orders as OrdersModel, OrderResponse,DeliveryAddress,CheckoutRequest
+from database.ProductTable import Orders as TableOrders, OrderItem, OrderStatus, Products,OrderLog as TableOrderLog,Carts
 from database.AdminTable import RecentActivity
 from database.UserTable import Address, User  
 import tools
+import StockReservations
+import Idempotency
 from datetime import datetime
 
 router = APIRouter(prefix="/orders", tags=["Cart & Orders"])
@@ -17,12 +20,26 @@ router = APIRouter(prefix="/orders", tags=["Cart & Orders"])
 # =========================
 
 @router.post("/add-order", response_model=OrderResponse)
-def add_order(order_data: OrdersModel, user_email: str = Cookie(None), db: Session = Depends(get_db)):
+def add_order(
+    order_data: OrdersModel,
+    user_email: str = Cookie(None),
+    idempotency_key: str | None = Header(default=None, max_length=255),
+    db: Session = Depends(get_db)
+):
     if not user_email:
         raise HTTPException(status_code=401, detail="User not found")
+    if order_data.quantity <= 0:
+        raise HTTPException(status_code=400, detail="Quantity must be at least 1")
+
+    # ✅ Retried request: replay the stored response instead of placing another order
+    if idempotency_key:
+        req_hash = Idempotency.request_hash("/orders/add-order", order_data.model_dump(mode="json"))
+        replay = Idempotency.claim(db, user_email, idempotency_key, req_hash)
+        if replay:
+            return replay
 
     # ✅ Get product
-    product = db.query(Products).filter(Products.id == order_data.product_id).with_for_update().first()
+    product = db.query(Products).filter(Products.id == order_data.product_id).first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
@@ -62,11 +79,10 @@ def add_order(order_data: OrdersModel, user_email: str = Cookie(None), db: Sessi
     )
     db.add(new_item)
 
-    # ✅ Commit everything together
-    db.commit()
-    db.refresh(product)
-    db.refresh(order)
-    db.refresh(new_item)
+    # ✅ Reserve the stock now so we never accept an order we cannot fill
+    if StockReservations.reserve(db, order.id, {product.id: order_data.quantity}):
+        db.rollback()
+        raise HTTPException(status_code=409, detail=f"Not enough stock for product '{product.tile_name}'")
 
     # ✅ Log recent activity
     activity = RecentActivity(
@@ -75,12 +91,10 @@ def add_order(order_data: OrdersModel, user_email: str = Cookie(None), db: Sessi
         created_at=datetime.now(tools.PH_TZ)
     )
     db.add(activity)
-    db.commit()
 
-    # ✅ Return response
-    return OrderResponse(
+    response = OrderResponse(
         order_id=order.id,
-        status=order.status.value,
+        status=OrderStatus.Pending.value,
         created_at=order.created_at,
         estimated_delivery=order.estimated_delivery,
         tile_image=product.tile_image,
@@ -98,36 +112,181 @@ def add_order(order_data: OrdersModel, user_email: str = Cookie(None), db: Sessi
             province=order.province,
         )
     )
+    if idempotency_key:
+        Idempotency.store(db, user_email, idempotency_key, 200, response.model_dump(mode="json"))
+
+    # ✅ Commit everything together
+    db.commit()
+    return response
+
+# =========================
+# 🧾 Checkout cart into one order
+# =========================
+@router.post("/checkout", response_model=list[OrderResponse])
+def checkout(
+    data: CheckoutRequest,
+    user_email: str = Cookie(None),
+    idempotency_key: str | None = Header(default=None, max_length=255),
+    db: Session = Depends(get_db)
+):
+    if not user_email:
+        raise HTTPException(status_code=401, detail="User not found")
+
+    # ✅ Retried request: replay the stored response instead of placing another order
+    if idempotency_key:
+        req_hash = Idempotency.request_hash("/orders/checkout", data.model_dump(mode="json"))
+        replay = Idempotency.claim(db, user_email, idempotency_key, req_hash)
+        if replay:
+            return replay
+
+    # ✅ User and active address in one query
+    user_row = (
+        db.query(User.id, Address)
+        .outerjoin(Address, and_(Address.user_id == User.id, Address.is_active == True))
+        .filter(User.email == user_email)
+        .first()
+    )
+    if not user_row:
+        raise HTTPException(status_code=404, detail="User not found")
+    active_address = user_row[1]
+    if not active_address:
+        raise HTTPException(status_code=400, detail="No active address found. Please set one before ordering.")
+
+    # ✅ Cart lines with their products, locked in product id order so
+    # concurrent checkouts always take row locks in the same sequence
+    lines_query = (
+        db.query(Carts.product_id, Carts.quantity, Products)
+        .join(Products, Products.id == Carts.product_id)
+        .filter(Carts.user_email == user_email)
+    )
+    if data.product_ids is not None:
+        lines_query = lines_query.filter(Carts.product_id.in_(data.product_ids))
+    lines = lines_query.order_by(Products.id).with_for_update(of=Products).all()
+
+    if not lines:
+        raise HTTPException(status_code=400, detail="Cart is empty")
+
+    archived = [product.tile_name for _, _, product in lines if product.is_archived]
+    if archived:
+        raise HTTPException(status_code=400, detail=f"No longer available: {', '.join(archived)}")
+    if any(quantity <= 0 for _, quantity, _ in lines):
+        raise HTTPException(status_code=400, detail="Quantity must be at least 1")
+
+    # ✅ Create order
+    order = TableOrders(
+        user_email=user_email,
+        status=OrderStatus.Pending,
+        house_number=active_address.house_number,
+        street=active_address.street,
+        barangay=active_address.barangay,
+        city=active_address.city,
+        province=active_address.province,
+    )
+    db.add(order)
+    db.flush()  # generate order.id without committing yet
+
+    # ✅ All order items in one multi-row INSERT
+    items = [
+        {
+            "order_id": order.id,
+            "product_id": product.id,
+            "quantity": quantity,
+            "tile_name": product.tile_name,
+            "tile_category": product.tile_category,
+            "tile_type": product.tile_type,
+            "tile_price": product.tile_price,
+            "tile_image": product.tile_image,
+        }
+        for _, quantity, product in lines
+    ]
+    db.execute(insert(OrderItem), items)
+
+    # ✅ Reserve stock for every line in one conditional UPDATE
+    short = StockReservations.reserve(db, order.id, {product.id: quantity for _, quantity, product in lines})
+    if short:
+        names = [product.tile_name for _, _, product in lines if product.id in short]
+        db.rollback()
+        raise HTTPException(status_code=409, detail=f"Not enough stock for: {', '.join(names)}")
+
+    # ✅ Clear the checked out lines
+    db.query(Carts).filter(
+        Carts.user_email == user_email,
+        Carts.product_id.in_([product_id for product_id, _, _ in lines])
+    ).delete(synchronize_session=False)
+
+    db.add(RecentActivity(
+        email=user_email,
+        activity=f"Placed an order #{order.id}",
+        created_at=datetime.now(tools.PH_TZ)
+    ))
+
+    delivery_address = DeliveryAddress(
+        house_number=active_address.house_number,
+        street=active_address.street,
+        barangay=active_address.barangay,
+        city=active_address.city,
+        province=active_address.province,
+    )
+    responses = [
+        OrderResponse(
+            order_id=item["order_id"],
+            status=OrderStatus.Pending.value,
+            created_at=order.created_at,
+            estimated_delivery=None,
+            tile_image=item["tile_image"] or "",
+            tile_category=item["tile_category"] or "",
+            tile_type=item["tile_type"] or "",
+            tile_name=item["tile_name"],
+            tile_price=item["tile_price"],
+            quantity=item["quantity"],
+            total_price=item["tile_price"] * item["quantity"],
+            delivery_address=delivery_address,
+        )
+        for item in items
+    ]
+    if idempotency_key:
+        Idempotency.store(db, user_email, idempotency_key, 200, [r.model_dump(mode="json") for r in responses])
+
+    # ✅ Commit everything together
+    db.commit()
+    return responses
 
 # =========================
 # 📦 Get Orders (with address)
 # =========================
 @router.get("/", response_model=list[OrderResponse])
 def get_orders(
+    response: Response,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: str | None = None,
     db: Session = Depends(get_db),
     user_email: str = Cookie(None)
 ):
     if not user_email:
         raise HTTPException(status_code=401, detail="Missing user email cookie")
 
-    # Exclude orders with status "Shipped" or "Rejected"
-    orders = (
+    # Exclude orders with status "Shipped" or "Rejected"; items come in one extra IN query
+    query = (
         db.query(TableOrders)
+        .options(selectinload(TableOrders.items))
         .filter(
             TableOrders.user_email == user_email,
             ~TableOrders.status.in_(["Shipped", "Rejected"])  # <-- exclude these
         )
-        .order_by(TableOrders.created_at.desc())
-        .all()
     )
+    try:
+        orders, next_cursor = tools.keyset_page(query, [TableOrders.created_at, TableOrders.id], cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    if not orders:
+    if not orders and not cursor:
         raise HTTPException(status_code=404, detail="No orders found for this user")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
 
     responses = []
     for order in orders:
-        order_items = db.query(OrderItem).filter(OrderItem.order_id == order.id).all()
-        for item in order_items:
+        for item in order.items:
             responses.append(
                 OrderResponse(
                     order_id=order.id,
@@ -156,21 +315,28 @@ def get_orders(
 
 @router.get("/logs", response_model=list[OrderResponse])
 def get_order_logs(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    status: list[OrderStatus] | None = Query(None),
     db: Session = Depends(get_db),
     user_email: str = Cookie(None)
 ):
     if not user_email:
         raise HTTPException(status_code=401, detail="Missing user email cookie")
 
-    logs = (
-        db.query(TableOrderLog)
-        .filter(TableOrderLog.user_email == user_email)
-        .order_by(TableOrderLog.created_at.desc())
-        .all()
-    )
+    query = db.query(TableOrderLog).filter(TableOrderLog.user_email == user_email)
+    if status:
+        query = query.filter(TableOrderLog.status.in_(status))
+    try:
+        logs, next_cursor = tools.keyset_page(query, [TableOrderLog.created_at, TableOrderLog.id], cursor, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    if not logs:
+    if not logs and not cursor:
         raise HTTPException(status_code=404, detail="No order logs found for this user")
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
 
     responses = []
     for log in logs:
@@ -207,10 +373,14 @@ def delete_order(order_id: int, user_email: str = Cookie(None), db: Session = De
     if not user_email:
         raise HTTPException(status_code=401, detail="User not found")
 
-    order = db.query(TableOrders).filter(TableOrders.id == order_id).first()
+    # Lock the order so a concurrent ship, reject or delete can't release it twice
+    order = db.query(TableOrders).filter(TableOrders.id == order_id).with_for_update().first()
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
+    if order.status in (OrderStatus.Shipped, OrderStatus.Rejected):
+        raise HTTPException(status_code=400, detail=f"Order is already {order.status.value}")
 
+    StockReservations.release(db, [order.id])
     db.query(OrderItem).filter(OrderItem.order_id == order.id).delete()
     db.delete(order)
     db.commit()
@@ -1,39 +1,424 @@
-from fastapi import APIRouter,Depends,HTTPException
+from fastapi import APIRouter,Depends,HTTPException,Query,Response,Header,Request
+from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, tuple_, literal, literal_column, insert
 from DatabaseConnector import get_db
-from database.ProductTable import Products,Sales
-from models.ProductModel import ProductResponse,AddNewProduct,UpdateProduct
+from database.ProductTable import Products,ProductFacet,ProductSalesTotal,PRODUCT_SEARCH_VECTOR
+from models.ProductModel import ProductResponse,AddNewProduct,UpdateProduct,ProductSearchResult
+import MediaStore
+import Exports
+import StockLedger
+import csv
+import io
+import json
+import tempfile
+import tools
+from CatalogCache import catalog_cache
+from ProductFacets import facet_keys, facet_delta, apply_facet_delta, PRICE_BUCKETS
 
 
 router = APIRouter(prefix="/product",tags=["product"])
 
+# Sparse fieldsets: ?fields=id,tile_name,... or ?view=compact for grid views
+PRODUCT_FIELDS = tuple(ProductResponse.model_fields)
+COMPACT_FIELDS = ("id", "tile_name", "tile_price", "tile_image", "tile_stock")
+
+
+def product_fields(
+    fields: str | None = Query(None, description="Comma separated product fields to return"),
+    view: str = Query("full", pattern="^(full|compact)$"),
+) -> tuple:
+    if not fields:
+        return COMPACT_FIELDS if view == "compact" else PRODUCT_FIELDS
+
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in PRODUCT_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    # Keep the response key order stable so cached bodies and ETags are reused
+    return tuple(f for f in PRODUCT_FIELDS if f in requested)
+
+
+SORT_COLUMNS = {
+    "id": Products.id,
+    "tile_price": Products.tile_price,
+    "tile_name": Products.tile_name,
+    "tile_stock": Products.tile_stock,
+}
+
+
+def catalog_params(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: str | None = None,
+    sort: str = Query("id", pattern="^(id|tile_price|tile_name|tile_stock)$"),
+    order: str = Query("asc", pattern="^(asc|desc)$"),
+    tile_category: str | None = None,
+    tile_type: str | None = None,
+    min_price: float | None = Query(None, ge=0),
+    max_price: float | None = Query(None, ge=0),
+    in_stock: bool | None = None,
+    fields: tuple = Depends(product_fields),
+):
+    return {
+        "limit": limit,
+        "cursor": cursor,
+        "sort": sort,
+        "order": order,
+        "tile_category": tile_category,
+        "tile_type": tile_type,
+        "min_price": min_price,
+        "max_price": max_price,
+        "in_stock": in_stock,
+        "fields": fields,
+    }
+
+
+def list_products(db: Session, params: dict, archived: bool | None):
+    """
+    Keyset paginated catalog listing. Rows are ordered by (sort column, id) and
+    the next page starts after the last row, so every page costs the same
+    regardless of how deep the client has scrolled.
+    Only the requested columns are selected and rows come back as plain dicts,
+    skipping ORM hydration and Pydantic validation.
+    Returns the page and the cursor for the next one (None on the last page).
+    """
+    fields = params["fields"]
+    # The cursor needs the sort key and id even when the client did not ask for them
+    selected = list(dict.fromkeys([*fields, "id", params["sort"]]))
+    query = db.query(*[getattr(Products, name) for name in selected])
+
+    if archived is not None:
+        query = query.filter(Products.is_archived == archived)
+    if params["tile_category"]:
+        query = query.filter(Products.tile_category == params["tile_category"])
+    if params["tile_type"]:
+        query = query.filter(Products.tile_type == params["tile_type"])
+    if params["min_price"] is not None:
+        query = query.filter(Products.tile_price >= params["min_price"])
+    if params["max_price"] is not None:
+        query = query.filter(Products.tile_price <= params["max_price"])
+    if params["in_stock"] is True:
+        query = query.filter(Products.tile_stock > 0)
+    elif params["in_stock"] is False:
+        query = query.filter(Products.tile_stock <= 0)
+
+    sort_column = SORT_COLUMNS[params["sort"]]
+    descending = params["order"] == "desc"
+
+    if params["cursor"]:
+        try:
+            last_value, last_id = tools.decode_cursor(params["cursor"], 2)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        keyset = tuple_(sort_column, Products.id)
+        query = query.filter(keyset < (last_value, last_id) if descending else keyset > (last_value, last_id))
+
+    if descending:
+        query = query.order_by(sort_column.desc(), Products.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), Products.id.asc())
+
+    # Fetch one extra row to know whether another page exists
+    rows = query.limit(params["limit"] + 1).all()
+    next_cursor = None
+    if len(rows) > params["limit"]:
+        rows = rows[:params["limit"]]
+        last = rows[-1]
+        next_cursor = tools.encode_cursor(getattr(last, params["sort"]), last.id)
+
+    return [{name: getattr(row, name) for name in fields} for row in rows], next_cursor
+
+
+def cached_response(entry: dict, if_none_match: str | None) -> Response:
+    headers = {"ETag": entry["etag"], "Cache-Control": "no-cache", **entry["headers"]}
+    if tools.etag_matches(if_none_match, entry["etag"]):
+        return Response(status_code=304, headers=headers)
+    return Response(content=entry["body"], media_type="application/json", headers=headers)
+
 
 @router.get("/admin", response_model=list[ProductResponse])
-def get_products(db: Session = Depends(get_db)):
-    products = db.query(Products).all()
-    return products
+def get_products(
+    archived: bool | None = None,
+    params: dict = Depends(catalog_params),
+    db: Session = Depends(get_db)
+):
+    products, next_cursor = list_products(db, params, archived)
+    return JSONResponse(content=products, headers={"X-Next-Cursor": next_cursor} if next_cursor else {})
 
 @router.get("/", response_model=list[ProductResponse])
-def get_products(db: Session = Depends(get_db)):
-    products = db.query(Products).filter(Products.is_archived == False).all()
-    return products
+def get_products(
+    params: dict = Depends(catalog_params),
+    if_none_match: str | None = Header(default=None),
+    db: Session = Depends(get_db)
+):
+    key = ("list", tuple(sorted(params.items())))
+    entry = catalog_cache.get(key)
+    if entry is None:
+        version = catalog_cache.version
+        products, next_cursor = list_products(db, params, archived=False)
+        entry = catalog_cache.put(
+            key,
+            version,
+            json.dumps(products).encode(),
+            {"X-Next-Cursor": next_cursor} if next_cursor else {},
+        )
+    return cached_response(entry, if_none_match)
+
+
+@router.get("/cache/stats")
+def get_catalog_cache_stats():
+    return catalog_cache.stats()
+
+
+@router.get("/search", response_model=list[ProductSearchResult])
+def search_products(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(20, ge=1, le=100),
+    db: Session = Depends(get_db)
+):
+    """
+    Ranked full-text search over name, category, type and description, with
+    trigram matching on tile_name so misspelled names still hit. Both
+    predicates are served by the GIN indexes from migrations/ProductSearchIndexes.py.
+    """
+    ts_query = func.websearch_to_tsquery(literal_column("'english'::regconfig"), q)
+    name_similarity = func.word_similarity(q, Products.tile_name)
+
+    # Rank and limit first so the headlines are only built for returned rows
+    matches = (
+        db.query(
+            Products.id.label("id"),
+            (func.ts_rank_cd(PRODUCT_SEARCH_VECTOR, ts_query) + name_similarity).label("rank"),
+        )
+        .filter(
+            Products.is_archived == False,
+            PRODUCT_SEARCH_VECTOR.op("@@")(ts_query) | literal(q).op("<%")(Products.tile_name),
+        )
+        .order_by(literal_column("rank").desc(), Products.id)
+        .limit(limit)
+        .subquery()
+    )
+
+    headline_options = "StartSel=<mark>, StopSel=</mark>, MaxFragments=2, MaxWords=20, MinWords=5"
+    rows = (
+        db.query(
+            Products,
+            matches.c.rank,
+            func.ts_headline(literal_column("'english'::regconfig"), Products.tile_name, ts_query, "StartSel=<mark>, StopSel=</mark>, HighlightAll=true"),
+            func.ts_headline(literal_column("'english'::regconfig"), Products.tile_description, ts_query, headline_options),
+        )
+        .join(matches, matches.c.id == Products.id)
+        .order_by(matches.c.rank.desc(), Products.id)
+        .all()
+    )
+
+    return [
+        ProductSearchResult(
+            **ProductResponse.model_validate(product, from_attributes=True).model_dump(),
+            rank=rank,
+            tile_name_highlight=name_highlight,
+            tile_description_highlight=description_highlight,
+        )
+        for product, rank, name_highlight, description_highlight in rows
+    ]
+
+
+@router.get("/facets")
+def get_product_facets(db: Session = Depends(get_db)):
+    """
+    Navigation counts for non-archived, in-stock products. Read from the
+    product_facets table, which every product write path keeps up to date.
+    """
+    counts = {"category": {}, "type": {}, "price": {}}
+    for facet in db.query(ProductFacet).filter(ProductFacet.count > 0).all():
+        counts.setdefault(facet.facet, {})[facet.value] = facet.count
+
+    return {
+        "categories": counts["category"],
+        "types": counts["type"],
+        "price_buckets": [
+            {"label": label, "min": low, "max": high, "count": counts["price"].get(label, 0)}
+            for label, low, high in PRICE_BUCKETS
+        ],
+    }
+
+
+@router.get("/sold")
+def get_total_sold_batch(
+    ids: str = Query(..., description="Comma separated product IDs"),
+    db: Session = Depends(get_db)
+):
+    try:
+        product_ids = sorted({int(i) for i in ids.split(",") if i.strip()})
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be a comma separated list of integers")
+    if len(product_ids) > 1000:
+        raise HTTPException(status_code=400, detail="At most 1000 product IDs per request")
+
+    totals = dict(
+        db.query(ProductSalesTotal.product_id, ProductSalesTotal.total_sold)
+        .filter(ProductSalesTotal.product_id.in_(product_ids))
+        .all()
+    )
+    return {"totals": {product_id: totals.get(product_id, 0) for product_id in product_ids}}
+
+
+# ---------------- BULK IMPORT / EXPORT ----------------
+IMPORT_CHUNK_SIZE = 1000
+MAX_IMPORT_ERRORS = 1000
+EXPORT_COLUMNS = [
+    "id", "tile_name", "tile_category", "tile_type", "tile_description",
+    "tile_price", "tile_stock", "is_archived", "tile_image",
+]
+
+
+def read_import_rows(file, format: str):
+    """
+    Yield (row_number, data) pairs from a CSV or NDJSON upload. data is a dict,
+    or an error message when the line itself could not be parsed.
+    """
+    text = io.TextIOWrapper(file, encoding="utf-8-sig", newline="")
+
+    if format == "csv":
+        reader = csv.DictReader(text)
+        for row in reader:
+            # Empty cells mean "not given", so optional fields fall back to their defaults
+            yield reader.line_num, {k: (v if v != "" else None) for k, v in row.items() if k}
+        return
+
+    for row_number, line in enumerate(text, start=1):
+        if not line.strip():
+            continue
+        try:
+            data = json.loads(line)
+        except ValueError:
+            yield row_number, "Invalid JSON"
+            continue
+        yield row_number, data if isinstance(data, dict) else "Each line must be a JSON object"
+
+
+def describe_import_error(e: ValueError) -> list[str]:
+    if isinstance(e, ValidationError):
+        return [f"{'.'.join(str(loc) for loc in err['loc']) or 'row'}: {err['msg']}" for err in e.errors()]
+    return [str(e)]
+
+
+def import_rows(db: Session, rows) -> dict:
+    inserted = 0
+    failed = 0
+    errors = []
+    batch = []
+
+    def flush():
+        nonlocal inserted, batch
+        if batch:
+            # One multi-row INSERT and one commit per chunk
+            created = db.execute(insert(Products).returning(Products.id, Products.tile_stock), batch).all()
+            StockLedger.log_entries(db, [
+                StockLedger.stock_entry(product_id, "initial", 0, stock) for product_id, stock in created if stock
+            ])
+            apply_facet_delta(db, facet_delta([], [key for values in batch for key in facet_keys(Products(**values))]))
+            db.commit()
+            inserted += len(batch)
+            batch = []
+
+    try:
+        for row_number, data in rows:
+            try:
+                if isinstance(data, str):
+                    raise ValueError(data)
+                product = AddNewProduct.model_validate(data)
+                if product.tile_price is None:
+                    raise ValueError("tile_price: Field required")
+                values = product.model_dump()
+                values["tile_image"] = MediaStore.store_image(db, values["tile_image"])
+                values["is_archived"] = bool(values["is_archived"])
+            except ValueError as e:
+                failed += 1
+                if len(errors) < MAX_IMPORT_ERRORS:
+                    errors.append({"row": row_number, "errors": describe_import_error(e)})
+                continue
+
+            batch.append(values)
+            if len(batch) >= IMPORT_CHUNK_SIZE:
+                flush()
+        flush()
+    finally:
+        if inserted:
+            catalog_cache.invalidate()
+
+    return {
+        "inserted": inserted,
+        "failed": failed,
+        "errors": errors,
+        "errors_truncated": failed > len(errors),
+    }
+
+
+@router.post("/import")
+async def import_products(
+    request: Request,
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    db: Session = Depends(get_db)
+):
+    """
+    Bulk import products from a CSV (with a header row) or NDJSON request body.
+    The body is spooled to a temp file as it arrives so memory stays bounded,
+    then validated against AddNewProduct and inserted in chunks. Valid rows are
+    kept even when others fail; the response lists the failing row numbers.
+    """
+    spool = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    try:
+        async for chunk in request.stream():
+            spool.write(chunk)
+        spool.seek(0)
+        return await run_in_threadpool(import_rows, db, read_import_rows(spool, format))
+    finally:
+        spool.close()
+
+
+@router.get("/export")
+def export_products(
+    format: str = Query("csv", pattern="^(csv|ndjson)$"),
+    gzip: bool = False,
+):
+    return Exports.export_response(
+        lambda db: db.query(*[getattr(Products, column) for column in EXPORT_COLUMNS]).order_by(Products.id),
+        EXPORT_COLUMNS, "products", format, gzip,
+    )
 
 
 @router.get("/{product_id}", response_model=ProductResponse)
-def get_product(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Products).filter(
-        Products.id == product_id,
-        Products.is_archived == False
-    ).first()
-    if not product:
-        raise HTTPException(status_code=404, detail="Product not found")
-    return product
+def get_product(
+    product_id: int,
+    fields: tuple = Depends(product_fields),
+    if_none_match: str | None = Header(default=None),
+    db: Session = Depends(get_db)
+):
+    key = ("product", product_id, fields)
+    entry = catalog_cache.get(key)
+    if entry is None:
+        version = catalog_cache.version
+        product = db.query(*[getattr(Products, name) for name in fields]).filter(
+            Products.id == product_id,
+            Products.is_archived == False
+        ).first()
+        if not product:
+            raise HTTPException(status_code=404, detail="Product not found")
+        entry = catalog_cache.put(key, version, json.dumps(dict(product._mapping)).encode())
+    return cached_response(entry, if_none_match)
 
 @router.post("/add-product",response_model=ProductResponse)
 def add_new_product(product_data:AddNewProduct, db: Session = Depends(get_db)):
+    try:
+        tile_image = MediaStore.store_image(db, product_data.tile_image)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     new_product = Products(
-        tile_image=product_data.tile_image,
+        tile_image=tile_image,
         tile_category=product_data.tile_category,
         tile_type=product_data.tile_type,
         tile_name=product_data.tile_name,
@@ -42,50 +427,73 @@ def add_new_product(product_data:AddNewProduct, db: Session = Depends(get_db)):
         tile_stock=product_data.tile_stock,
     )
     db.add(new_product)
+    db.flush()
+    apply_facet_delta(db, facet_delta([], facet_keys(new_product)))
+    if new_product.tile_stock:
+        StockLedger.log_entries(db, [StockLedger.stock_entry(new_product.id, "initial", 0, new_product.tile_stock)])
     db.commit()
+    catalog_cache.invalidate()
     db.refresh(new_product)
     return new_product
 
 @router.put("/{product_id}", response_model=ProductResponse)
 def update_product(product_id: int, product_data: UpdateProduct, db: Session = Depends(get_db)):
-    db_product = db.query(Products).filter(Products.id == product_id).first()
+    db_product = db.query(Products).filter(Products.id == product_id).with_for_update().first()
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
+    facets_before = facet_keys(db_product)
+
+    try:
+        tile_image = MediaStore.store_image(db, product_data.tile_image)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-    db_product.tile_image = product_data.tile_image
+    db_product.tile_image = tile_image
     db_product.tile_category = product_data.tile_category
     db_product.tile_type = product_data.tile_type
     db_product.tile_name = product_data.tile_name
     db_product.tile_description = product_data.tile_description
     db_product.tile_price = product_data.tile_price
-    db_product.tile_stock = product_data.tile_stock
+    # Leaving tile_stock out keeps the current stock
+    previous_stock = db_product.tile_stock or 0
+    if product_data.tile_stock is not None:
+        db_product.tile_stock = product_data.tile_stock
+    apply_facet_delta(db, facet_delta(facets_before, facet_keys(db_product)))
+    if product_data.tile_stock is not None and product_data.tile_stock != previous_stock:
+        StockLedger.log_entries(db, [StockLedger.stock_entry(db_product.id, "update", previous_stock, db_product.tile_stock)])
 
     db.commit()
+    catalog_cache.invalidate()
     db.refresh(db_product)
     return db_product
 
 
 @router.delete("/{product_id}")
 def delete_product(product_id: int, db: Session = Depends(get_db)):
-    db_product = db.query(Products).filter(Products.id == product_id).first()
+    db_product = db.query(Products).filter(Products.id == product_id).with_for_update().first()
     if not db_product:
         raise HTTPException(status_code=404, detail="Product not found")
 
+    apply_facet_delta(db, facet_delta(facet_keys(db_product), []))
     db.delete(db_product)
     db.commit()
+    catalog_cache.invalidate()
     return {"message": f"Product {product_id} deleted successfully"}
 
 
 
 @router.patch("/toggle-archive/{product_id}", response_model=ProductResponse)
 def toggle_archive(product_id: int, db: Session = Depends(get_db)):
-    product = db.query(Products).filter(Products.id == product_id).first()
+    product = db.query(Products).filter(Products.id == product_id).with_for_update().first()
     if not product:
         raise HTTPException(status_code=404, detail="Product not found")
 
+    facets_before = facet_keys(product)
     product.is_archived = not product.is_archived
+    apply_facet_delta(db, facet_delta(facets_before, facet_keys(product)))
 
     db.commit()
+    catalog_cache.invalidate()
     db.refresh(product)
     return product
 
@@ -96,8 +504,8 @@ def get_total_sold(product_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="Product not found")
 
     total_sold = (
-        db.query(func.sum(Sales.quantity))
-        .filter(Sales.product_id == product_id)
+        db.query(ProductSalesTotal.total_sold)
+        .filter(ProductSalesTotal.product_id == product_id)
         .scalar()
     ) or 0
 
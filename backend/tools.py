@@ -1,5 +1,67 @@
-from datetime import datetime, timezone, timedelta
+from datetime import datetime, timezone, timedelta, time, date
+from sqlalchemy import tuple_, DateTime
+import base64
+import json
 
 PH_TZ = timezone(timedelta(hours=8))
 
 
+# Opaque keyset cursors: the last row's sort values, base64 encoded JSON
+def encode_cursor(*values) -> str:
+    raw = json.dumps(list(values), default=lambda v: v.isoformat() if isinstance(v, datetime) else str(v))
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str, size: int) -> list:
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError("Invalid cursor")
+    return values
+
+def keyset_page(query, columns: list, cursor: str | None, limit: int, descending: bool = True):
+    """
+    Apply keyset pagination over the given columns (the last one must be unique,
+    usually the id) and return (rows, next_cursor). Rows must expose each
+    column under its key. Raises ValueError for a malformed cursor.
+    """
+    if cursor:
+        values = decode_cursor(cursor, len(columns))
+        values = [
+            datetime.fromisoformat(v) if isinstance(col.type, DateTime) and v is not None else v
+            for col, v in zip(columns, values)
+        ]
+        key = tuple_(*columns)
+        query = query.filter(key < tuple(values) if descending else key > tuple(values))
+
+    query = query.order_by(*[col.desc() if descending else col.asc() for col in columns])
+
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(*[getattr(rows[-1], col.key) for col in columns])
+    return rows, next_cursor
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    return etag in [t.strip().removeprefix("W/") for t in if_none_match.split(",")]
+
+def date_range(column, start_date: date | None, end_date: date | None) -> list:
+    """
+    Filters keeping rows whose column falls on start_date..end_date (inclusive,
+    PH calendar days). Works for both naive PH timestamps and timezone-aware columns.
+    """
+    tz = PH_TZ if column.type.timezone else None
+    conditions = []
+    if start_date:
+        conditions.append(column >= datetime.combine(start_date, time.min, tz))
+    if end_date:
+        conditions.append(column < datetime.combine(end_date + timedelta(days=1), time.min, tz))
+    return conditions
+
+def like_prefix(value: str) -> str:
+    """Lowercased LIKE pattern matching values that start with value; % and _ match literally."""
+    return value.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
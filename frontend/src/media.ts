@@ -0,0 +1,7 @@
+const backend = import.meta.env.VITE_BACKEND_URL
+
+// Product images are stored as "/media/{hash}" references on the backend
+export const mediaUrl = (path?: string | null): string => {
+  if (!path) return ''
+  return path.startsWith('/media/') ? `${backend}${path}` : path
+}